@@ -15,6 +15,9 @@ import pandas as pd
 from typing import List, Dict, Tuple
 import torch
 
+from core.heuristic.rank_artifact import shared_ranks, load_rank_artifact
+from core.heuristic.threshold import threshold_sweep
+
 
 def plot_pessimistic_rank(y_pred_pos, y_pred_neg):
     plt.figure(figsize=(12, 8))
@@ -44,17 +47,18 @@ def evaluate_auc(val_pred, val_true):
     results['AP'] = valid_ap
     return results
 
-def error_mrr_pos(y_pred_pos, pos_edge_index, y_pred_neg, k_list):
-    # add one axis
-    y_pred_pos = y_pred_pos.view(-1, 1)
-    # optimistic rank: "how many negatives have at least the positive score?"
-    # ~> the positive is ranked first among those with equal score
-    optimistic_rank = (y_pred_neg >= y_pred_pos).sum(dim=1)
-    # pessimistic rank: "how many negatives have a larger score than the positive?"
-    # ~> the positive is ranked last among those with equal score
-    pessimistic_rank = (y_pred_neg > y_pred_pos).sum(dim=1)
-    # ~> the positive is ranked last among those with equal score
-    ranking_list = 0.5 * (optimistic_rank + pessimistic_rank) + 1
+def error_mrr_pos(y_pred_pos, pos_edge_index, y_pred_neg, k_list, ranking_list=None):
+    if ranking_list is None:
+        # add one axis
+        y_pred_pos = y_pred_pos.view(-1, 1)
+        # optimistic rank: "how many negatives have at least the positive score?"
+        # ~> the positive is ranked first among those with equal score
+        optimistic_rank = (y_pred_neg >= y_pred_pos).sum(dim=1)
+        # pessimistic rank: "how many negatives have a larger score than the positive?"
+        # ~> the positive is ranked last among those with equal score
+        pessimistic_rank = (y_pred_neg > y_pred_pos).sum(dim=1)
+        # ~> the positive is ranked last among those with equal score
+        ranking_list = 0.5 * (optimistic_rank + pessimistic_rank) + 1
 
     plot_rank_list(ranking_list, 'pos')
     plt.figure(figsize=(10, 6))
@@ -103,17 +107,18 @@ def error_mrr_pos(y_pred_pos, pos_edge_index, y_pred_neg, k_list):
 
 
 
-def error_mrr_neg(y_pred_neg, neg_edge_index, y_pred_pos, k_list):
-    # calculate ranks
-    y_pred_neg = y_pred_neg.view(-1, 1)
-    # optimistic rank: "how many negatives have at least the positive score?"
-    # ~> the positive is ranked first among those with equal score
-    optimistic_rank = (y_pred_neg <= y_pred_pos).sum(dim=1)
-    # pessimistic rank: "how many negatives have a larger score than the positive?"
-    # ~> the positive is ranked last among those with equal score
-    pessimistic_rank = (y_pred_neg < y_pred_pos).sum(dim=1)
-    
-    ranking_list = 0.5 * (optimistic_rank + pessimistic_rank) - 1
+def error_mrr_neg(y_pred_neg, neg_edge_index, y_pred_pos, k_list, ranking_list=None):
+    if ranking_list is None:
+        # calculate ranks
+        y_pred_neg = y_pred_neg.view(-1, 1)
+        # optimistic rank: "how many negatives have at least the positive score?"
+        # ~> the positive is ranked first among those with equal score
+        optimistic_rank = (y_pred_neg <= y_pred_pos).sum(dim=1)
+        # pessimistic rank: "how many negatives have a larger score than the positive?"
+        # ~> the positive is ranked last among those with equal score
+        pessimistic_rank = (y_pred_neg < y_pred_pos).sum(dim=1)
+
+        ranking_list = 0.5 * (optimistic_rank + pessimistic_rank) - 1
     
     plot_rank_list(ranking_list, 'neg')
     
@@ -163,7 +168,9 @@ def get_metric_invariant(
     pos_edge_index: torch.Tensor,
     neg_test_pred: torch.Tensor,
     neg_edge_index: torch.Tensor,
-    k_list: List[float]
+    k_list: List[float],
+    pos_rank: torch.Tensor = None,
+    neg_rank: torch.Tensor = None
 ) -> Tuple[float, float, Dict[str, float], float, float, float, float]:
     """
     Computes metrics for evaluating link prediction models.
@@ -173,6 +180,8 @@ def get_metric_invariant(
     :param neg_test_pred: Tensor of negative test predictions.
     :param neg_edge_index: Tensor of negative edge indices.
     :param k_list: List of float values representing thresholds for ranking.
+    :param pos_rank: Optional precomputed ranks of the positives, e.g. of a rank artifact.
+    :param neg_rank: Optional precomputed ranks of the negatives, e.g. of a rank artifact.
     :return: Tuple containing the MRR for positive-to-negative and negative-to-positive predictions,
              AUC and AP scores as a dictionary, and errors in edge index and rank.
     """
@@ -194,18 +203,25 @@ def get_metric_invariant(
     if neg_test_pred.size(0) != neg_edge_index.size(0):
         raise ValueError("neg_test_pred and neg_edge_index size mismatch")
 
+    # Ranks of the shared negatives via sort + searchsorted, no [P, N] comparison
+    if pos_rank is None or neg_rank is None:
+        pos_rank, neg_rank = shared_ranks(pos_test_pred, neg_test_pred)
+
     # Calculate metrics using provided functions
     mrr_pos2neg, pos_edge_index_err, pos_rank_err = error_mrr_pos(
         pos_test_pred,
         pos_edge_index,
-        neg_test_pred.repeat(pos_test_pred.size(0), 1),
-        k_rank
+        neg_test_pred,
+        k_rank,
+        ranking_list=torch.as_tensor(np.asarray(pos_rank, dtype=np.float64))
     )
+    # error_mrr_neg counts from -1 instead of 1
     mrr_neg2pos, neg_edge_index_err, neg_rank_err = error_mrr_neg(
         neg_test_pred,
         neg_edge_index,
-        pos_test_pred.repeat(neg_test_pred.size(0), 1),
-        k_rank
+        pos_test_pred,
+        k_rank,
+        ranking_list=torch.as_tensor(np.asarray(neg_rank, dtype=np.float64)) - 2
     )
     
     # Concatenate predictions and true labels
@@ -264,16 +280,10 @@ def plot_rank_list(position: torch.tensor, label: str, sample_size: int=20):
 def find_opt_thres(pos_probs, neg_probs, thres=None):
     if thres is None:
         thres = np.linspace(0, 1, num=100)
-    y_true = np.concatenate([np.ones(len(pos_probs)), np.zeros(len(neg_probs))])
-    y_scores = np.concatenate([pos_probs, neg_probs])
-    best_thres = 0
-    best_acc = 0
-    for t in thres:
-        y_pred = (y_scores >= t).astype(int)
-        acc = accuracy_score(y_true, y_pred)
-        if acc > best_acc:
-            best_acc = acc
-            best_thres = t
+    # accuracy at every threshold from one sort of the scores, the first best threshold wins
+    curves = threshold_sweep(torch.as_tensor(np.asarray(pos_probs)), torch.as_tensor(np.asarray(neg_probs)), thres)
+    best = int(torch.argmax(curves['ACC']))
+    best_thres, best_acc = thres[best], curves['ACC'][best].item()
 
     pos_pred = (pos_probs >= best_thres).astype(int)
     neg_pred = (neg_probs >= best_thres).astype(int)
@@ -323,6 +333,22 @@ def load_results(file_path):
     return P1, P2, pos_index, neg_index
 
 
+def load_rank_results(artifact_dir):
+    """
+    Same as load_results for a rank artifact of heuristic/rank_artifact.py, the columns are memory-mapped
+    and the ranks come precomputed.
+
+    Returns:
+    P1, P2, pos_index, neg_index as load_results, and the ranks of the positives and negatives.
+    """
+    artifact = load_rank_artifact(artifact_dir)
+    print(artifact['meta'])
+    pos, neg = artifact['pos'], artifact['neg']
+    pos_index = np.stack([pos['src'], pos['dst']], axis=1)
+    neg_index = np.stack([neg['src'], neg['dst']], axis=1)
+    return pos['score'], neg['score'], pos_index, neg_index, pos['rank'], neg['rank']
+
+
 def plot_pos_neg_histogram(Pos, Neg, best_thres=None):
     plt.figure(figsize=(12, 8))
     # Plot distributions of probabilities
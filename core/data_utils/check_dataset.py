@@ -1,5 +1,8 @@
 import argparse
-from load import load_data_lp
+from itertools import combinations
+from typing import Dict
+import numpy as np
+import torch
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description='GraphGym')
@@ -13,42 +16,100 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 def check_data_leakage(splits):
-    sets = ['train', 'valid', 'test']
     leakage = False
-
-    # Extract indices
-    train_pos_index = set(map(tuple, splits['train'].pos_edge_label_index.t().tolist()))
-    train_neg_index = set(map(tuple, splits['train'].neg_edge_label_index.t().tolist()))
-    valid_pos_index = set(map(tuple, splits['valid'].pos_edge_label_index.t().tolist()))
-    valid_neg_index = set(map(tuple, splits['valid'].neg_edge_label_index.t().tolist()))
-    test_pos_index = set(map(tuple, splits['test'].pos_edge_label_index.t().tolist()))
-    test_neg_index = set(map(tuple, splits['test'].neg_edge_label_index.t().tolist()))
+    # directed pairs as the original set of tuples check, see check_split_integrity for the full report
+    overlap = check_split_integrity(splits, undirected=False)['overlap']
+    names = {'pos': 'positive', 'neg': 'negative'}
 
     # Check for leakage
-    if train_pos_index & valid_pos_index:
-        print("Data leakage found between train and valid positive samples.")
-        leakage = True
-    if train_pos_index & test_pos_index:
-        print("Data leakage found between train and test positive samples.")
-        leakage = True
-    if valid_pos_index & test_pos_index:
-        print("Data leakage found between valid and test positive samples.")
-        leakage = True
-    if train_neg_index & valid_neg_index:
-        print("Data leakage found between train and valid negative samples.")
-        leakage = True
-    if train_neg_index & test_neg_index:
-        print("Data leakage found between train and test negative samples.")
-        leakage = True
-    if valid_neg_index & test_neg_index:
-        print("Data leakage found between valid and test negative samples.")
-        leakage = True
+    for kind in ['pos', 'neg']:
+        for a, b in [('train', 'valid'), ('train', 'test'), ('valid', 'test')]:
+            if overlap.get(f'{a}_{kind}&{b}_{kind}', 0):
+                print(f"Data leakage found between {a} and {b} {names[kind]} samples.")
+                leakage = True
 
     if not leakage:
         print("No data leakage found.")
 
     return leakage
 
+def edge_keys(edge_index, num_nodes: int, undirected: bool = True) -> np.ndarray:
+    """
+    pack every edge (u, v) into the int64 key u * num_nodes + v, (min, max) for undirected graphs
+    """
+    edges = torch.as_tensor(edge_index).cpu().numpy().astype(np.int64).reshape(2, -1)
+    src, dst = edges
+    if undirected:
+        src, dst = np.minimum(src, dst), np.maximum(src, dst)
+    return src * num_nodes + dst
+
+
+def _isin_sorted(keys: np.ndarray, sorted_keys: np.ndarray) -> np.ndarray:
+    if sorted_keys.size == 0:
+        return np.zeros(keys.shape[0], dtype=bool)
+    loc = np.minimum(np.searchsorted(sorted_keys, keys), sorted_keys.size - 1)
+    return sorted_keys[loc] == keys
+
+
+def check_split_integrity(splits, num_nodes: int = None, undirected: bool = True) -> Dict[str, Dict[str, int]]:
+    """
+    Vectorized split check, every edge set is packed into int64 keys and sorted once.
+    :param splits: {'train', 'valid', 'test'} of Data with pos/neg_edge_label_index and edge_index
+    :param num_nodes: number of nodes, taken from the splits if None
+    :param undirected: (u, v) and (v, u) are the same edge
+    :return: report with the number of
+             edges:        edges of every set, e.g. 'train_pos'
+             self_loops:   self loops of every set
+             duplicates:   repeated edges within every set
+             overlap:      edges shared by two sets, e.g. 'train_pos&valid_pos', any of them is leakage
+             missing:      train positives that are not in the train message passing graph
+             in_graph:     valid / test positives that are in the message passing graph of their split
+             leakage:      1 if any overlap or in_graph count is positive
+    """
+    if num_nodes is None:
+        num_nodes = max(int(splits[split].num_nodes) for split in splits)
+
+    keys = {}
+    for split in ['train', 'valid', 'test']:
+        for kind in ['pos', 'neg']:
+            if f'{kind}_edge_label_index' in splits[split]:
+                keys[f'{split}_{kind}'] = edge_keys(splits[split][f'{kind}_edge_label_index'], num_nodes, undirected)
+
+    report = {'edges': {}, 'self_loops': {}, 'duplicates': {}, 'overlap': {}, 'missing': {}, 'in_graph': {}}
+    unique = {}
+    for name, key in keys.items():
+        unique[name] = np.unique(key)
+        report['edges'][name] = int(key.size)
+        # self loops are the keys on the diagonal u * num_nodes + u
+        report['self_loops'][name] = int((key % (num_nodes + 1) == 0).sum())
+        report['duplicates'][name] = int(key.size - unique[name].size)
+
+    for a, b in combinations(keys, 2):
+        report['overlap'][f'{a}&{b}'] = int(_isin_sorted(unique[a], unique[b]).sum())
+
+    for split in ['train', 'valid', 'test']:
+        if f'{split}_pos' not in unique or 'edge_index' not in splits[split]:
+            continue
+        graph = np.unique(edge_keys(splits[split].edge_index, num_nodes, undirected))
+        found = int(_isin_sorted(unique[f'{split}_pos'], graph).sum())
+        if split == 'train':
+            report['missing']['train_pos'] = int(unique['train_pos'].size - found)
+        else:
+            report['in_graph'][f'{split}_pos'] = found
+
+    leakage = any(report['overlap'].values()) or any(report['in_graph'].values())
+    report['leakage'] = int(leakage)
+    return report
+
+
+def print_split_report(report: Dict[str, Dict[str, int]]):
+    for section in ['self_loops', 'duplicates', 'overlap', 'missing', 'in_graph']:
+        for name, count in report[section].items():
+            if count:
+                print(f"{section}: {name} {count}")
+    print("Data leakage found." if report['leakage'] else "No data leakage found.")
+
+
 def check_self_loops(data):
     self_loops = (data.edge_index[0] == data.edge_index[1]).nonzero(as_tuple=False)
     if self_loops.size(0) > 0:
@@ -63,6 +124,7 @@ def check_edges_completeness(splits, data):
 
 
 if __name__ == "__main__":
+    from load import load_data_lp
     args = parse_args()
     args.split_index = [0.8, 0.15, 0.05]
     for dataset in ['pwc_small', 'cora', 'arxiv_2023', 'pubmed', 'pwc_medium', 'citationv8', 'ogbn-arxiv']:
@@ -70,6 +132,7 @@ if __name__ == "__main__":
         args.name = dataset
         splits, text, data = load_data_lp[dataset](args)
         check_data_leakage(splits)
+        print_split_report(check_split_integrity(splits, data.num_nodes, args.undirected))
         check_self_loops(data)
         check_edges_completeness(splits, data)
 
@@ -0,0 +1,210 @@
+"""
+Memory-mapped binary CSR graph format.
+A graph is a directory holding a small header.json and one .npy file per array, opened with mmap so nothing is read
+before it is used and processes working on the same graph share it through the page cache:
+    indptr.npy      int64 [N + 1]
+    indices.npy     int32 / int64 [E], the targets of every row
+    eid.npy         int64 [E], position of the CSR edge in the original edge_index, restores the original order
+    edge_<key>.npy  edge tensors of the Data (e.g. edge_attr) in CSR order
+    node_<key>.npy  node tensors of the Data (x, y, masks, ...)
+convert_dataset writes the format once for a registered dataset, the graph loaders of load_data_nc.py open it
+instead of the pickled Data whenever it exists.
+"""
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import shutil
+from typing import Callable, Dict
+import numpy as np
+import scipy.sparse as ssp
+import torch
+from torch_geometric.data import Data
+
+from graphgps.utility.utils import get_git_repo_root_path
+
+FILE_PATH = get_git_repo_root_path() + '/'
+CSR_ROOT = FILE_PATH + 'core/dataset/csr'
+CSR_VERSION = 1
+
+
+def csr_path(name: str, method: str = None, root: str = CSR_ROOT) -> str:
+    return os.path.join(root, name if method is None else f'{name}_{method}')
+
+
+def csr_exists(name: str, method: str = None, root: str = CSR_ROOT) -> bool:
+    return os.path.exists(os.path.join(csr_path(name, method, root), 'header.json'))
+
+
+def _edge_arrays(data: Data):
+    if 'edge_index' in data and data.edge_index is not None:
+        edge_index = data.edge_index
+    else:
+        # ToSparseTensor stores the transposed adjacency only
+        row, col, _ = data.adj_t.t().coo()
+        edge_index = torch.stack([row, col])
+    row, col = edge_index.cpu().numpy().astype(np.int64)
+    return row, col
+
+
+def save_csr_graph(path: str, data: Data) -> None:
+    """
+    :param path: directory of the graph, replaced atomically
+    :param data: pyg Data, tensors with one row per node or edge are stored, json serializable scalars go
+                 into the header, anything else raises a ValueError so that the loaded Data equals the saved one
+    """
+    num_nodes = int(data.num_nodes)
+    row, col = _edge_arrays(data)
+    num_edges = row.shape[0]
+    # stable sort by source keeps the original target order within every row
+    eid = np.argsort(row, kind='stable')
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(row, minlength=num_nodes))]).astype(np.int64)
+    index_dtype = np.int32 if num_nodes < 2 ** 31 else np.int64
+
+    tmp = f'{path}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    header = {'version': CSR_VERSION, 'num_nodes': num_nodes, 'num_edges': num_edges,
+              'node': [], 'edge': [], 'attrs': {}}
+    np.save(os.path.join(tmp, 'indptr.npy'), indptr)
+    np.save(os.path.join(tmp, 'indices.npy'), col[eid].astype(index_dtype))
+    np.save(os.path.join(tmp, 'eid.npy'), eid.astype(np.int64))
+    for key, value in data.items():
+        if key in ('edge_index', 'adj_t', 'num_nodes'):
+            continue
+        if isinstance(value, torch.Tensor) and value.dim() > 0 and value.size(0) == num_nodes and data.is_node_attr(key):
+            np.save(os.path.join(tmp, f'node_{key}.npy'), value.cpu().numpy())
+            header['node'].append(key)
+        elif isinstance(value, torch.Tensor) and value.dim() > 0 and value.size(0) == num_edges and data.is_edge_attr(key):
+            np.save(os.path.join(tmp, f'edge_{key}.npy'), value.cpu().numpy()[eid])
+            header['edge'].append(key)
+        elif isinstance(value, (int, float, str, bool)) or value is None:
+            header['attrs'][key] = value
+        else:
+            raise ValueError(f'{key} of type {type(value).__name__} cannot be stored in the CSR graph')
+    with open(os.path.join(tmp, 'header.json'), 'w') as f:
+        json.dump(header, f, indent=1)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    print(f'saved {num_nodes} nodes and {num_edges} edges to {path}')
+
+
+class CSRGraph(object):
+    """read-only view of a graph saved by save_csr_graph, every array is memory-mapped on first access"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'header.json')) as f:
+            self.header = json.load(f)
+        if self.header['version'] != CSR_VERSION:
+            raise ValueError(f'{path} has CSR version {self.header["version"]}, expected {CSR_VERSION}')
+        self.num_nodes = self.header['num_nodes']
+        self.num_edges = self.header['num_edges']
+        self._arrays = {}
+
+    def array(self, name: str) -> np.ndarray:
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode='r')
+        return self._arrays[name]
+
+    def _writable(self, name: str) -> np.ndarray:
+        # copy-on-write mapping for tensors handed out, in-place ops touch private pages and never the files
+        return np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode='c')
+
+    @property
+    def indptr(self) -> np.ndarray:
+        return self.array('indptr')
+
+    @property
+    def indices(self) -> np.ndarray:
+        return self.array('indices')
+
+    @property
+    def eid(self) -> np.ndarray:
+        return self.array('eid')
+
+    def node(self, key: str) -> np.ndarray:
+        return self.array(f'node_{key}')
+
+    def neighbors(self, node: int) -> np.ndarray:
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def to_scipy(self) -> ssp.csr_matrix:
+        """adjacency with unit weights, the index arrays stay memory-mapped"""
+        data = np.ones(self.num_edges, dtype=np.float32)
+        return ssp.csr_matrix((data, self.indices, self.indptr), shape=(self.num_nodes, self.num_nodes))
+
+    def edge_index(self, original_order: bool = True) -> torch.Tensor:
+        row = np.repeat(np.arange(self.num_nodes, dtype=np.int64), np.diff(self.indptr))
+        edge_index = np.stack([row, self.indices.astype(np.int64)])
+        if original_order:
+            restored = np.empty_like(edge_index)
+            restored[:, self.eid] = edge_index
+            edge_index = restored
+        return torch.from_numpy(edge_index)
+
+    def to_data(self, original_order: bool = True) -> Data:
+        """
+        Data as it was saved, node tensors are copy-on-write views of the memory-mapped files,
+        edge_index is materialized
+        """
+        data = Data(edge_index=self.edge_index(original_order), num_nodes=self.num_nodes, **self.header['attrs'])
+        for key in self.header['node']:
+            data[key] = torch.from_numpy(self._writable(f'node_{key}'))
+        for key in self.header['edge']:
+            value = self._writable(f'edge_{key}')
+            if original_order:
+                restored = np.empty_like(value)
+                restored[self.eid] = value
+                value = restored
+            data[key] = torch.from_numpy(value)
+        return data
+
+
+def open_csr_graph(name: str, method: str = None, root: str = CSR_ROOT) -> CSRGraph:
+    return CSRGraph(csr_path(name, method, root))
+
+
+def load_csr_data(name: str, method: str = None, root: str = CSR_ROOT) -> Data:
+    return open_csr_graph(name, method, root).to_data()
+
+
+def _sources() -> Dict[str, Callable]:
+    # imported here, load_data_nc opens the CSR graphs of this module
+    from data_utils import load_data_nc as nc
+    return {
+        'pubmed': lambda method: nc.load_graph_pubmed(False),
+        'arxiv_2023': lambda method: nc.load_graph_arxiv23(),
+        'ogbn-arxiv': lambda method: nc.load_graph_ogbn_arxiv(False),
+        'citeseer': lambda method: nc.load_graph_citeseer(),
+        'citationv8': lambda method: nc.load_embedded_citationv8(method) if method else nc.load_pyg_citationv8(),
+        'pwc_small': lambda method: nc.load_graph_pwc_small(method),
+        'pwc_medium': lambda method: nc.load_graph_pwc_medium(method),
+        'pwc_large': lambda method: nc.load_graph_pwc_large(method),
+    }
+
+
+def convert_dataset(name: str, method: str = None, root: str = CSR_ROOT) -> CSRGraph:
+    """
+    One-time conversion of a registered dataset, e.g. convert_dataset('pwc_large', 'w2v').
+    :param method: feature variant of the pwc and citationv8 graphs (w2v, tfidf, ...)
+    """
+    sources = _sources()
+    if name not in sources:
+        raise ValueError(f'unknown dataset {name}, choose from {list(sources)}')
+    data = sources[name](method)
+    if isinstance(data, tuple):
+        data = data[0]
+    path = csr_path(name, method, root)
+    os.makedirs(root, exist_ok=True)
+    save_csr_graph(path, data)
+    return CSRGraph(path)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='convert datasets to the memory-mapped CSR format')
+    parser.add_argument('--name', type=str, nargs='+', required=True)
+    parser.add_argument('--method', type=str, required=False, default=None)
+    args = parser.parse_args()
+    for name in args.name:
+        convert_dataset(name, args.method)
@@ -7,11 +7,9 @@ import torch
 from torch_sparse.tensor import SparseTensor
 from ogb.nodeproppred import PygNodePropPredDataset
 from ogb.linkproppred import PygLinkPropPredDataset
-from scipy.sparse import coo_matrix
-from tqdm import tqdm 
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse.csgraph import connected_components, breadth_first_order
 from typing import List
-import torch_geometric.utils as pyg_utils
-import networkx as nx
 import time 
 
 def get_Data(data: Data):
@@ -27,18 +25,52 @@ def get_Data(data: Data):
 
 def get_largest_connected_component(dataset: InMemoryDataset) -> np.ndarray:
   data = get_Data(dataset)
+  labels, sizes = connected_component_labels(data.edge_index, data.num_nodes)
+  return np.flatnonzero(labels == np.argmax(sizes))
 
-  remaining_nodes = set(range(data.x.shape[0]))
 
-  comps = []
-  while remaining_nodes:
-    start = min(remaining_nodes)
-    comp = get_component(dataset, start)
-    comps.append(comp)
+def csr_adjacency(edge_index, num_nodes: int = None) -> csr_matrix:
+  row, col = get_row_col(edge_index)
+  if num_nodes is None:
+    num_nodes = int(max(row.max(initial=-1), col.max(initial=-1))) + 1
+  return csr_matrix((np.ones(row.shape[0], dtype=np.int8), (row, col)), shape=(num_nodes, num_nodes))
 
-    remaining_nodes = remaining_nodes.difference(comp)
 
-  return np.array(list(comps[np.argmax(list(map(len, comps)))]))
+def connected_component_labels(edge_index, num_nodes: int = None, connection: str = 'weak'):
+  """component id of every node and the size of every component, 'strong' for directed graphs"""
+  A = csr_adjacency(edge_index, num_nodes)
+  _, labels = connected_components(A, directed=connection == 'strong', connection=connection)
+  return labels, np.bincount(labels)
+
+
+def node_subgraph(data: Data, nodes: np.ndarray) -> Data:
+  """
+  induced subgraph on nodes, renumbered 0..len(nodes)-1 in the order of nodes;
+  x, y and every other tensor with one row per node are reordered the same way
+  """
+  nodes = np.asarray(nodes, dtype=np.int64)
+  num_nodes = data.num_nodes
+  mapper = np.full(num_nodes, -1, dtype=np.int64)
+  mapper[nodes] = np.arange(nodes.shape[0])
+
+  row, col = get_row_col(data.edge_index)
+  keep = (mapper[row] >= 0) & (mapper[col] >= 0)
+  edge_index = torch.from_numpy(np.stack([mapper[row[keep]], mapper[col[keep]]]))
+
+  index = torch.from_numpy(nodes)
+  node_tensors = {key: value[index] for key, value in data.items()
+                  if isinstance(value, torch.Tensor) and key not in ('edge_index', 'node_attrs')
+                  and value.dim() > 0 and value.size(0) == num_nodes and data.is_node_attr(key)}
+  x_new = node_tensors.pop('x', None)
+  return Data(
+      x = x_new,
+      edge_index = edge_index,
+      num_nodes = nodes.shape[0],
+      node_attrs = x_new,
+      edge_attrs = None,
+      graph_attrs = None,
+      **node_tensors
+  )
 
 
 def get_node_mapper(lcc: np.ndarray) -> dict:
@@ -79,17 +111,9 @@ def get_component(dataset: InMemoryDataset, start: int = 0) -> set:
       set: return a set of the node set of local connected component of the graph
   """
   data = get_Data(dataset)
-  visited_nodes = set()
-  queued_nodes = set([start])
-  row, col = get_row_col(data.edge_index)
-    
-  while queued_nodes:
-    current_node = queued_nodes.pop()
-    visited_nodes.update([current_node])
-    neighbors = col[np.where(row == current_node)[0]]
-    neighbors = [n for n in neighbors if n not in visited_nodes and n not in queued_nodes]
-    queued_nodes.update(neighbors)
-  return visited_nodes
+  # BFS over the CSR rows, every edge is visited once
+  A = csr_adjacency(data.edge_index, data.num_nodes)
+  return set(breadth_first_order(A, start, directed=True, return_predecessors=False).tolist())
 
 
 def get_comp_data(adjacencyList: List[List[int]], start: int = 0) -> set:
@@ -134,86 +158,36 @@ def construct_sparse_adj(edge_index) -> coo_matrix:
     return m
   
 def use_lcc(dataset: InMemoryDataset) -> InMemoryDataset:
-    # lcc = get_largest_connected_component(dataset)
-    m = construct_sparse_adj(dataset.edge_index.numpy())
-    
-    start = time.time()
-    G = nx.from_scipy_sparse_array(m)
-    print('create graph:', time.time() - start)
-    
-    for i, c in enumerate(sorted(nx.connected_components(G), key=len, reverse=True)):
-      if i == 0:
-        print([len(c)])
-        G = G.subgraph(c)
-      if i > 0 and i < 5:
-        print([len(c)])
-      else:
-        break
-      
-    lcc_index = list(max(nx.connected_components(G), key=len))
+    """
+    Restrict the graph to its largest (weakly) connected component.
+    Components come from scipy csgraph on the CSR adjacency, edges are filtered with a node mask and
+    renumbered through an index array, x, y and the other node tensors are reordered alike.
+    :return: the subgraph, the old ids of its nodes in ascending order (to reorder texts, text[lcc_index]),
+             and the component id of every original node
+    """
     data = get_Data(dataset)
-    
-    if data.x is not None:
-      x_new = data.x[lcc_index]
-    else:
-      x_new = None
-      
-    row, col = get_row_col(data.edge_index)
-
-    lcc_set = set(lcc_index)
-    mask = np.array([(i in lcc_set and j in lcc_set) for i, j in zip(row, col)])
-    filtered_edges = np.column_stack((row[mask], col[mask]))
-    node_mapper = get_node_mapper(lcc_index)
-    edges = remap_edges(filtered_edges, node_mapper)
-
-    new_data = Data(
-        x = x_new,
-        edge_index = torch.LongTensor(edges),
-        # y=y_new,
-        num_nodes = torch.LongTensor(edges).max().tolist()+1,
-        node_attrs = x_new, 
-        edge_attrs = None, 
-        graph_attrs = None
-    )
-
-    return new_data, lcc_index, G
+    start = time.time()
+    labels, sizes = connected_component_labels(data.edge_index, data.num_nodes)
+    print('connected components:', time.time() - start)
+    print(sorted(sizes.tolist(), reverse=True)[:5])
+
+    lcc_index = np.flatnonzero(labels == np.argmax(sizes))
+    new_data = node_subgraph(data, lcc_index)
+    return new_data, lcc_index.tolist(), labels
   
 
-def find_scc_direc(data) -> List:
-    # Convert PyTorch Geometric graph to NetworkX graph
-    G = pyg_utils.to_networkx(data, to_undirected=False)
-    
-    # Compute strongly connected components
-    sccs = list(nx.strongly_connected_components(G))
-    
-    # Find the largest strongly connected component
-    largest_scc = max(sccs, key=len)
-    
-    return list(largest_scc)
+def find_scc_direc(data, connection: str = 'strong') -> List:
+    """
+    nodes of the largest strongly (or with connection='weak', weakly) connected component of a directed graph,
+    in ascending order
+    """
+    labels, sizes = connected_component_labels(data.edge_index, data.num_nodes, connection)
+    return np.flatnonzero(labels == np.argmax(sizes)).tolist()
   
   
 def use_lcc_direc(data, lcc):
-    # Create a mask for the nodes in the largest SCC
-    lcc = list(lcc)
-    x_new = data.x[lcc]
-    
-    row, col = get_row_col(data.edge_index)
-    edges = [[i, j] for i, j in tqdm(zip(row, col)) if i in lcc and j in lcc]
-    edges = remap_edges(edges, get_node_mapper(lcc))
-
-    subgraph = Data(
-        x=x_new,
-        edge_index=torch.LongTensor(edges),
-        # y=y_new,
-        num_nodes=x_new.size()[0],
-        # train_mask=torch.zeros(y_new.size()[0], dtype=torch.bool),
-        # test_mask=torch.zeros(y_new.size()[0], dtype=torch.bool),
-        # val_mask=torch.zeros(y_new.size()[0], dtype=torch.bool),
-        node_attrs=x_new, 
-        edge_attrs = None, 
-        graph_attrs = None
-    )
-    return subgraph
+    # induced subgraph on the component, node i of the subgraph is lcc[i]
+    return node_subgraph(data, np.asarray(list(lcc), dtype=np.int64))
 
 
 
@@ -39,6 +39,9 @@ from data_utils.load_data_nc import load_tag_cora, load_tag_pubmed, \
     load_embedded_citationv8, load_pyg_citationv8
 from graphgps.utility.utils import get_git_repo_root_path, config_device, init_cfg_test
 from data_utils.lcc import find_scc_direc, use_lcc_direc, use_lcc
+from data_utils.check_dataset import check_split_integrity, print_split_report
+from data_utils.split_cache import cached_splits
+from data_utils.text_store import take_text
 
 
 FILE = 'core/dataset/ogbn_products_orig/ogbn-products.csv'
@@ -46,6 +49,7 @@ FILE_PATH = get_git_repo_root_path() + '/'
 
 
 # arxiv_2023
+@cached_splits('arxiv_2023', ['core/dataset/arxiv_2023', 'core/dataset/arxiv_2023_orig'])
 def load_taglp_arxiv2023(cfg: CN, lcc_bool: bool=True) -> Tuple[Dict[str, Data], List[str]]:
 
     data, text = load_tag_arxiv23()
@@ -55,7 +59,7 @@ def load_taglp_arxiv2023(cfg: CN, lcc_bool: bool=True) -> Tuple[Dict[str, Data],
     
     if lcc_bool:
         data, lcc, _ = use_lcc(data)
-        text = [text[i] for i in lcc]
+        text = take_text(text, lcc)
         
     if data.is_directed() is True:
         data.edge_index = to_undirected(data.edge_index)
@@ -75,6 +79,7 @@ def load_taglp_arxiv2023(cfg: CN, lcc_bool: bool=True) -> Tuple[Dict[str, Data],
     return splits, text, data
 
 
+@cached_splits('cora', ['core/dataset/cora_orig'])
 def load_taglp_cora(cfg: CN, lcc_bool: bool=True) -> Tuple[Dict[str, Data], List[str]]:
     # add one default argument
 
@@ -84,7 +89,7 @@ def load_taglp_cora(cfg: CN, lcc_bool: bool=True) -> Tuple[Dict[str, Data], List
     if lcc_bool: 
         data, lcc, _ = use_lcc(data)
         
-        text = [text[i] for i in lcc]
+        text = take_text(text, lcc)
         
     data.edge_index, _ = coalesce(data.edge_index, None, num_nodes=data.num_nodes)
     data.edge_index, _ = remove_self_loops(data.edge_index)
@@ -107,6 +112,7 @@ def load_taglp_cora(cfg: CN, lcc_bool: bool=True) -> Tuple[Dict[str, Data], List
     return splits, text, data
 
 
+@cached_splits('ogbn-arxiv', ['core/dataset/ogbn_arixv_orig'])
 def load_taglp_ogbn_arxiv(cfg: CN) -> Tuple[Dict[str, Data], List[str]]:
     # add one default argument
 
@@ -132,6 +138,7 @@ def load_taglp_ogbn_arxiv(cfg: CN) -> Tuple[Dict[str, Data], List[str]]:
     print(f"num of texts in dataset: {len(text)}")
     return splits, text, data
 
+@cached_splits('pwc_large', ['core/dataset/pwc_large'])
 def load_taglp_pwc_large(cfg: CN) -> Tuple[Dict[str, Data], List[str]]:
     # add one default argument
 
@@ -173,9 +180,12 @@ def get_edge_split(data: Data,
     ])
     del data.adj_t, data.e_id, data.batch_size, data.n_asin, data.n_id
     train_data, val_data, test_data = transform(data)
-    return {'train': train_data, 'valid': val_data, 'test': test_data}
+    splits = {'train': train_data, 'valid': val_data, 'test': test_data}
+    print_split_report(check_split_integrity(splits, data.num_nodes, undirected))
+    return splits
 
 
+@cached_splits('ogbn_products', ['core/dataset/ogbn_products_orig'])
 def load_taglp_product(cfg: CN) -> Tuple[Dict[str, Data], List[str]]:
     # add one default argument
 
@@ -208,6 +218,7 @@ def time_function(func):
     return wrapper
 
 @time_function
+@cached_splits('pubmed', ['core/dataset/PubMed_orig'])
 def load_taglp_pubmed(cfg: CN) -> Tuple[Dict[str, Data], List[str]]:
     # add one default argument
 
@@ -228,6 +239,7 @@ def load_taglp_pubmed(cfg: CN) -> Tuple[Dict[str, Data], List[str]]:
                             )
     return splits, text, data
 
+@cached_splits('citeseer', ['generated_dataset/CiteSeer'])
 def load_taglp_citeseer(cfg: CN) -> Tuple[Dict[str, Data], List[str]]:
     # add one default argument
 
@@ -247,6 +259,7 @@ def load_taglp_citeseer(cfg: CN) -> Tuple[Dict[str, Data], List[str]]:
                             )
     return splits, text, data
 
+@cached_splits('citationv8', ['core/dataset/citationv8', 'core/dataset/citationv8_orig'])
 def load_taglp_citationv8(cfg: CN, lcc_bool: bool=True) -> Tuple[Dict[str, Data], List[str]]:
     # add one default argument
     
@@ -264,7 +277,7 @@ def load_taglp_citationv8(cfg: CN, lcc_bool: bool=True) -> Tuple[Dict[str, Data]
     
     if lcc_bool:
         data, lcc, _ = use_lcc(data)
-        text = [text[i] for i in lcc]
+        text = take_text(text, lcc)
     
     splits = get_edge_split(data,
                             undirected,
@@ -284,6 +297,7 @@ def load_taglp_citationv8(cfg: CN, lcc_bool: bool=True) -> Tuple[Dict[str, Data]
 
 
  
+@cached_splits('pwc_large', ['core/dataset/pwc_large'])
 def load_taglp_pwc_large(cfg: CN) -> Tuple[Dict[str, Data], List[str]]:
     if hasattr(cfg, 'method'):
         pass
@@ -311,6 +325,7 @@ def load_taglp_pwc_large(cfg: CN) -> Tuple[Dict[str, Data], List[str]]:
     return splits, df, data
 
 
+@cached_splits('pwc_medium', ['core/dataset/pwc_medium'])
 def load_taglp_pwc_medium(cfg: CN) -> Tuple[Dict[str, Data], List[str]]:
     if hasattr(cfg, 'method'):
         pass
@@ -342,6 +357,7 @@ def load_taglp_pwc_medium(cfg: CN) -> Tuple[Dict[str, Data], List[str]]:
     return splits, text, data
 
 
+@cached_splits('pwc_small', ['core/dataset/pwc_small'])
 def load_taglp_pwc_small(cfg: CN) -> Tuple[Dict[str, Data], List[str]]:
     if hasattr(cfg, 'method'):
         pass
@@ -412,9 +428,10 @@ def load_text_benchmark(data_name: str) -> pd.DataFrame:
         df = load_text_citationv8()
     if data_name == 'pwc_large':
         df = load_text_pwc_large()
-    if type(df) is list:
-        df = pd.DataFrame(df, columns=['text'])
-        return df
+    if not isinstance(df, pd.DataFrame):
+        # a list of texts or a TextStore
+        df = pd.DataFrame(list(df), columns=['text'])
+    return df
 
 
 def token_statistic(datasets):
@@ -16,6 +16,8 @@ from torch_geometric.transforms import RandomLinkSplit
 from graphgps.utility.utils import get_git_repo_root_path # type: ignore
 from typing import Tuple, List, Dict, Set, Any 
 from data_utils.lcc import use_lcc
+from data_utils.csr_graph import csr_exists, load_csr_data
+from data_utils.text_store import text_store_exists, open_text_store
 import torch_geometric.utils as pyg_utils
 import networkx as nx 
 # import dgl 
@@ -61,12 +63,16 @@ def get_node_mask_ogb(num_nodes: int, idx_splits: Dict[str, torch.Tensor]) -> tu
 
 # Function to parse Cora dataset
 def load_graph_arxiv23() -> Data:
+    if csr_exists('arxiv_2023'):
+        return load_csr_data('arxiv_2023')
     data = torch.load(FILE_PATH + 'core/dataset/arxiv_2023/graph.pt')
     # data.edge_index = data.adj_t.to_symmetric()
     return data
 
 # Function to parse PubMed dataset
 def load_text_arxiv23() -> List[str]:
+    if text_store_exists('arxiv_2023'):
+        return open_text_store('arxiv_2023')
     # Add your implementation here
     df = pd.read_csv(FILE_PATH + 'core/dataset/arxiv_2023_orig/paper_info.csv')
     return [
@@ -214,6 +220,8 @@ def load_graph_product():
     
     
 def load_text_product() -> List[str]:
+    if text_store_exists('ogbn_products'):
+        return open_text_store('ogbn_products')
     text = pd.read_csv(FILE_PATH + 'core/dataset/ogbn_products_orig/ogbn-products_subset.csv')
     text = [f'Product:{ti}; Description: {cont}\n'for ti,
             cont in zip(text['title'], text['content'])]
@@ -308,6 +316,9 @@ def parse_pubmed():
 
 
 def load_graph_pubmed(use_mask) -> Data:
+    # the CSR copy holds the graph without node masks, the masks are drawn from the RNG on every load
+    if not use_mask and csr_exists('pubmed'):
+        return load_csr_data('pubmed')
     _, data_X, data_Y, data_pubid, data_edges = parse_pubmed()
     data_X = normalize(data_X, norm="l1")
 
@@ -353,6 +364,8 @@ def load_graph_pubmed(use_mask) -> Data:
         
 # Function to parse PubMed dataset
 def load_text_pubmed() -> List[str]:
+    if text_store_exists('pubmed'):
+        return open_text_store('pubmed')
     f = open(FILE_PATH + 'core/dataset/PubMed_orig/pubmed.json')
     pubmed = json.load(f)
     df_pubmed = pd.DataFrame.from_dict(pubmed)
@@ -370,6 +383,8 @@ def load_tag_pubmed(use_mask) -> Tuple[Data, List[str]]:
 
 
 def load_text_ogbn_arxiv():
+    if text_store_exists('ogbn-arxiv'):
+        return open_text_store('ogbn-arxiv')
     nodeidx2paperid = pd.read_csv(
         FILE_PATH + 'core/dataset/ogbn_arixv_orig/mapping/nodeidx2paperid.csv.gz', compression='gzip')
 
@@ -387,6 +402,8 @@ def load_text_ogbn_arxiv():
       
     
 def load_graph_ogbn_arxiv(use_mask):
+    if not use_mask and csr_exists('ogbn-arxiv'):
+        return load_csr_data('ogbn-arxiv')
     dataset = PygNodePropPredDataset(root='./generated_dataset',
         name='ogbn-arxiv', transform=T.ToSparseTensor())
     data = dataset[0]
@@ -456,14 +473,20 @@ def load_graph_citationv8() -> Data:
     return graph
 
 def load_pyg_citationv8() -> Data:
+    if csr_exists('citationv8'):
+        return load_csr_data('citationv8')
     return torch.load(FILE_PATH + 'core/dataset/citationv8/citationv8_pyg2015.pt')
     
 
 def load_embedded_citationv8(method) -> Data:
+    if csr_exists('citationv8', method):
+        return load_csr_data('citationv8', method)
     return torch.load(FILE_PATH + f'core/dataset/citationv8/citationv8_{method}.pt')
     
 
 def load_text_citationv8() -> List[str]:
+    if text_store_exists('citationv8'):
+        return open_text_store('citationv8')
     df = pd.read_csv(FILE_PATH + 'core/dataset/citationv8_orig/Citation-2015.csv')
     print(f"Number of texts: {len(df['text'].tolist())}")
     return df['text'].tolist()
@@ -483,6 +506,8 @@ def load_tag_citationv8() -> Tuple[Data, List[str]]:
 
 
 def load_graph_citeseer() -> Data:
+    if csr_exists('citeseer'):
+        return load_csr_data('citeseer')
     # load data
     data_name = 'CiteSeer'
     dataset = Planetoid('./generated_dataset', data_name, transform=T.NormalizeFeatures())
@@ -502,29 +527,41 @@ def load_tag_citeseer() -> Tuple[Data, List[str]]:
 
 
 def load_graph_pwc_large(method):
+    if csr_exists('pwc_large', method):
+        return load_csr_data('pwc_large', method)
     graph = torch.load(FILE_PATH+f'core/dataset/pwc_large/pwc_{method}_large_undirec.pt')
     return graph 
 
 
 def load_text_pwc_large() -> List[str]:
+    if text_store_exists('pwc_large'):
+        return open_text_store('pwc_large')
     raw_text = pd.read_csv(FILE_PATH + f'core/dataset/pwc_large/pwc_large_papers.csv')
     return raw_text['feat'].tolist()
 
 
 def load_graph_pwc_medium(method):
+    if csr_exists('pwc_medium', method):
+        return load_csr_data('pwc_medium', method)
     return torch.load(FILE_PATH+f'core/dataset/pwc_medium/pwc_{method}_medium_undirec.pt')
 
 
 def load_text_pwc_medium(method) -> List[str]:
+    if text_store_exists('pwc_medium', method):
+        return open_text_store('pwc_medium', method)
     raw_text = pd.read_csv(FILE_PATH + f'core/dataset/pwc_medium/pwc_{method}_medium_text.csv')
     return raw_text['feat'].tolist()
 
 
 def load_graph_pwc_small(method):
+    if csr_exists('pwc_small', method):
+        return load_csr_data('pwc_small', method)
     return torch.load(FILE_PATH+f'core/dataset/pwc_small/pwc_{method}_small_undirec.pt') 
 
 
 def load_text_pwc_small(method) -> List[str]:
+    if text_store_exists('pwc_small', method):
+        return open_text_store('pwc_small', method)
     raw_text = pd.read_csv(FILE_PATH + f'core/dataset/pwc_small/pwc_{method}_small_text.csv')
     return raw_text['feat'].tolist()
     
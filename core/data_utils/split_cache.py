@@ -0,0 +1,165 @@
+"""
+Content-addressed cache of the processed link prediction splits of load_data_lp.py.
+The key hashes the loader, a fingerprint (path, size, mtime) of its raw files, the loader arguments (e.g. lcc_bool),
+the split ratios, the negative sampling settings and cfg.seed of the data config. The wrapper seeds torch, numpy and
+python's random (RandomLinkSplit draws its negatives with random.sample) from it before a cold split, so the key
+determines the split. Without cfg.seed the split is unseeded and never cached.
+Every tensor of the train / valid / test Data and of the processed graph is stored as its own .npy file and loaded
+back memory-mapped copy-on-write, the texts are pickled. The splits and the graph are returned on cfg.device on
+cold and warm runs alike.
+The RNG states after the split are stored as well, so warm runs continue with the same random streams as cold ones.
+Set cfg.split_cache = False to bypass the cache, the drivers set cfg.data.seed next to cfg.seed to use it.
+"""
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import functools
+import hashlib
+import inspect
+import json
+import random
+import shutil
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+import torch
+import torch_geometric.transforms as T
+from torch_geometric import seed_everything
+from torch_geometric.data import Data
+
+from graphgps.utility.utils import get_git_repo_root_path, config_device
+
+FILE_PATH = get_git_repo_root_path() + '/'
+CACHE_ROOT = FILE_PATH + 'core/dataset/split_cache'
+SPLITS = ('train', 'valid', 'test')
+
+
+def raw_fingerprint(raw_dirs: List[str]) -> List[Tuple[str, int, int]]:
+    """(path, size, mtime) of every file below the raw directories, relative to the repository root"""
+    files = []
+    for raw_dir in raw_dirs:
+        root = os.path.join(FILE_PATH, raw_dir)
+        if os.path.isfile(root):
+            stat = os.stat(root)
+            files.append((raw_dir, stat.st_size, stat.st_mtime_ns))
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                stat = os.stat(path)
+                files.append((os.path.relpath(path, FILE_PATH), stat.st_size, stat.st_mtime_ns))
+    return files
+
+
+def _rng_state() -> Dict:
+    rng = {'cpu': torch.get_rng_state(), 'numpy': np.random.get_state(), 'python': random.getstate()}
+    if torch.cuda.is_available():
+        rng['cuda'] = torch.cuda.get_rng_state_all()
+    return rng
+
+
+def _set_rng_state(rng: Dict) -> None:
+    torch.set_rng_state(rng['cpu'])
+    np.random.set_state(rng['numpy'])
+    random.setstate(rng['python'])
+    if 'cuda' in rng and torch.cuda.is_available() and torch.cuda.device_count() == len(rng['cuda']):
+        torch.cuda.set_rng_state_all(rng['cuda'])
+
+
+def split_cache_key(settings: Dict) -> str:
+    return hashlib.sha1(json.dumps(settings, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _save_data(path: str, data: Data) -> None:
+    os.makedirs(path)
+    meta, attrs = {'num_nodes': data.num_nodes, 'tensors': []}, {}
+    for key, value in data.items():
+        if isinstance(value, torch.Tensor):
+            np.save(os.path.join(path, f'{key}.npy'), value.detach().cpu().numpy())
+            meta['tensors'].append(key)
+        else:
+            attrs[key] = value
+    torch.save(attrs, os.path.join(path, 'attrs.pt'))
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+
+def _load_data(path: str, mmap: bool = True) -> Data:
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    data = Data(**torch.load(os.path.join(path, 'attrs.pt'), weights_only=False))
+    for key in meta['tensors']:
+        # copy-on-write, in-place ops of the caller touch private pages and never the cache files
+        array = np.load(os.path.join(path, f'{key}.npy'), mmap_mode='c' if mmap else None)
+        data[key] = torch.from_numpy(array)
+    data.num_nodes = meta['num_nodes']
+    return data
+
+
+def save_split_cache(path: str, splits: Dict[str, Data], text, data: Data, settings: Dict) -> None:
+    """write into a temporary directory first, concurrent runs never see half a cache"""
+    tmp = f'{path}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    try:
+        for split in SPLITS:
+            _save_data(os.path.join(tmp, split), splits[split])
+        _save_data(os.path.join(tmp, 'data'), data)
+        torch.save(text, os.path.join(tmp, 'text.pt'))
+        torch.save(_rng_state(), os.path.join(tmp, 'rng.pt'))
+        with open(os.path.join(tmp, 'settings.json'), 'w') as f:
+            json.dump(settings, f, default=str, indent=1)
+        os.replace(tmp, path)
+    except OSError as e:
+        # another run may have written the same key meanwhile, or the disk is read only
+        shutil.rmtree(tmp, ignore_errors=True)
+        print(f'split cache not written to {path}: {e}')
+
+
+def load_split_cache(path: str, device, mmap: bool = True) -> Tuple[Dict[str, Data], object, Data]:
+    to_device = T.ToDevice(device)
+    splits = {split: to_device(_load_data(os.path.join(path, split), mmap)) for split in SPLITS}
+    data = to_device(_load_data(os.path.join(path, 'data'), mmap))
+    text = torch.load(os.path.join(path, 'text.pt'), weights_only=False)
+    _set_rng_state(torch.load(os.path.join(path, 'rng.pt'), weights_only=False))
+    return splits, text, data
+
+
+def cached_splits(name: str, raw_dirs: List[str]) -> Callable:
+    """
+    Decorator of the load_taglp_* functions (cfg, ...) -> (splits, text, data).
+    :param name: dataset name, part of the cache directory
+    :param raw_dirs: files and directories the loader reads, relative to the repository root
+    """
+    def decorator(load: Callable) -> Callable:
+        signature = inspect.signature(load)
+
+        @functools.wraps(load)
+        def wrapper(cfg, *args, **kwargs):
+            seed = getattr(cfg, 'seed', None)
+            if not getattr(cfg, 'split_cache', True) or seed is None:
+                return load(cfg, *args, **kwargs)
+            arguments = signature.bind(cfg, *args, **kwargs)
+            arguments.apply_defaults()
+            settings = {
+                'name': name,
+                'loader': load.__name__,
+                'arguments': {key: value for key, value in arguments.arguments.items() if key != 'cfg'},
+                'raw': raw_fingerprint(raw_dirs),
+                'split_index': list(cfg.split_index),
+                'include_negatives': cfg.include_negatives,
+                'split_labels': cfg.split_labels,
+                'method': getattr(cfg, 'method', None),
+                'seed': seed,
+            }
+            path = os.path.join(getattr(cfg, 'split_cache_dir', CACHE_ROOT), f'{name}_{split_cache_key(settings)}')
+            if os.path.exists(os.path.join(path, 'settings.json')):
+                print(f'load splits of {name} from {path}')
+                return load_split_cache(path, config_device(cfg).device)
+
+            seed_everything(seed)
+            splits, text, data = load(cfg, *args, **kwargs)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            save_split_cache(path, splits, text, data, settings)
+            # older pyg versions move the graph to the device in place inside get_edge_split, newer ones do not
+            return splits, text, T.ToDevice(config_device(cfg).device)(data)
+        return wrapper
+    return decorator
@@ -0,0 +1,180 @@
+"""
+Columnar, memory-mapped store of node texts.
+All texts of a dataset are one UTF-8 blob, text i is blob[offsets[i]:offsets[i + 1]]:
+    text.bin        the concatenated UTF-8 bytes
+    offsets.npy     int64 [N + 1]
+    missing.npy     bool [N], texts that were NaN / None in the source (read back as NaN like pandas)
+    header.json     number of texts and the format version
+TextStore is a lazy sequence over the store, a text is decoded when it is indexed, so runs that never touch the
+texts pay nothing and the rest stream them from the page cache. Slices are decoded into a list of str, what the
+batch loops of the embedding scripts hand to the HF tokenizers.
+convert_text writes the store once for a registered dataset, the load_text_* functions of load_data_nc.py return
+a TextStore instead of a list whenever the store exists.
+"""
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import shutil
+from collections.abc import Sequence
+from typing import Callable, Dict, Iterable, List, Union
+import numpy as np
+
+from graphgps.utility.utils import get_git_repo_root_path
+
+FILE_PATH = get_git_repo_root_path() + '/'
+TEXT_ROOT = FILE_PATH + 'core/dataset/text_store'
+TEXT_VERSION = 1
+
+
+def text_path(name: str, method: str = None, root: str = TEXT_ROOT) -> str:
+    return os.path.join(root, name if method is None else f'{name}_{method}')
+
+
+def text_store_exists(name: str, method: str = None, root: str = TEXT_ROOT) -> bool:
+    return os.path.exists(os.path.join(text_path(name, method, root), 'header.json'))
+
+
+def _is_missing(text) -> bool:
+    return text is None or (isinstance(text, float) and text != text)
+
+
+def save_text_store(path: str, texts: Iterable) -> None:
+    """
+    :param path: directory of the store, replaced atomically
+    :param texts: node texts in node order, non strings other than NaN / None are stored as str(text)
+    """
+    tmp = f'{path}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    offsets, missing = [0], []
+    # the texts are encoded one at a time, the blob never has to fit into memory
+    with open(os.path.join(tmp, 'text.bin'), 'wb') as f:
+        for text in texts:
+            missing.append(_is_missing(text))
+            encoded = b'' if missing[-1] else str(text).encode('utf-8')
+            f.write(encoded)
+            offsets.append(offsets[-1] + len(encoded))
+    np.save(os.path.join(tmp, 'offsets.npy'), np.asarray(offsets, dtype=np.int64))
+    np.save(os.path.join(tmp, 'missing.npy'), np.asarray(missing, dtype=bool))
+    with open(os.path.join(tmp, 'header.json'), 'w') as f:
+        json.dump({'version': TEXT_VERSION, 'num_texts': len(missing)}, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    print(f'saved {len(missing)} texts ({offsets[-1]} bytes) to {path}')
+
+
+class TextStore(Sequence):
+    """
+    Read-only sequence of the texts of a store, optionally restricted to and reordered by index
+    (e.g. the nodes of the largest connected component). Indexing with an int returns the text,
+    with a slice a list of the texts, with a list or array of indices another lazy TextStore.
+    """
+
+    def __init__(self, path: str, index: np.ndarray = None):
+        self.path = path
+        with open(os.path.join(path, 'header.json')) as f:
+            header = json.load(f)
+        if header['version'] != TEXT_VERSION:
+            raise ValueError(f'{path} has text store version {header["version"]}, expected {TEXT_VERSION}')
+        self.num_texts = header['num_texts']
+        self.index = None if index is None else np.asarray(index, dtype=np.int64)
+        self._blob = self._offsets = self._missing = None
+
+    def _open(self):
+        if self._offsets is None:
+            self._offsets = np.load(os.path.join(self.path, 'offsets.npy'), mmap_mode='r')
+            self._missing = np.load(os.path.join(self.path, 'missing.npy'), mmap_mode='r')
+            # np.memmap cannot map an empty file
+            size = int(self._offsets[-1])
+            self._blob = np.memmap(os.path.join(self.path, 'text.bin'), dtype=np.uint8, mode='r') \
+                if size else np.zeros(0, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return self.num_texts if self.index is None else self.index.shape[0]
+
+    def _text(self, i: int):
+        self._open()
+        if self._missing[i]:
+            return float('nan')
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].tobytes().decode('utf-8')
+
+    def __getitem__(self, key) -> Union[str, List[str], 'TextStore']:
+        if not isinstance(key, slice) and np.ndim(key) == 0:
+            key = int(key)
+            if not -len(self) <= key < len(self):
+                raise IndexError(f'text {key} out of range for {len(self)} texts')
+            key %= len(self)
+            return self._text(key if self.index is None else int(self.index[key]))
+        if isinstance(key, slice):
+            return [self[i] for i in range(*key.indices(len(self)))]
+        positions = np.asarray(key)
+        if positions.dtype == bool:
+            if positions.shape != (len(self),):
+                raise IndexError(f'boolean mask of shape {positions.shape} for {len(self)} texts')
+            positions = np.flatnonzero(positions)
+        positions = positions.astype(np.int64, copy=False)
+        return TextStore(self.path, positions if self.index is None else self.index[positions])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def tolist(self) -> List[str]:
+        return list(self)
+
+    def __reduce__(self):
+        # pickling (e.g. by the split cache) keeps the view lazy instead of copying every text
+        return TextStore, (self.path, self.index)
+
+    def __repr__(self) -> str:
+        return f'TextStore({self.path}, {len(self)} texts)'
+
+
+def open_text_store(name: str, method: str = None, root: str = TEXT_ROOT) -> TextStore:
+    return TextStore(text_path(name, method, root))
+
+
+def take_text(text, index) -> Union[List[str], TextStore]:
+    """text[index] for a list of texts or a TextStore, the store stays lazy"""
+    if isinstance(text, TextStore):
+        return text[index]
+    return [text[i] for i in index]
+
+
+def _sources() -> Dict[str, Callable]:
+    # imported here, load_data_nc opens the stores of this module
+    from data_utils import load_data_nc as nc
+    return {
+        'arxiv_2023': lambda method: nc.load_text_arxiv23(),
+        'pubmed': lambda method: nc.load_text_pubmed(),
+        'ogbn-arxiv': lambda method: nc.load_text_ogbn_arxiv(),
+        'ogbn_products': lambda method: nc.load_text_product(),
+        'citationv8': lambda method: nc.load_text_citationv8(),
+        'pwc_small': lambda method: nc.load_text_pwc_small(method),
+        'pwc_medium': lambda method: nc.load_text_pwc_medium(method),
+        'pwc_large': lambda method: nc.load_text_pwc_large(),
+    }
+
+
+def convert_text(name: str, method: str = None, root: str = TEXT_ROOT) -> TextStore:
+    """
+    One-time conversion of the texts of a registered dataset, e.g. convert_text('pwc_medium', 'w2v').
+    :param method: variant of the pwc_small / pwc_medium texts
+    """
+    sources = _sources()
+    if name not in sources:
+        raise ValueError(f'unknown dataset {name}, choose from {list(sources)}')
+    path = text_path(name, method, root)
+    os.makedirs(root, exist_ok=True)
+    save_text_store(path, sources[name](method))
+    return TextStore(path)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='convert node texts to the memory-mapped text store')
+    parser.add_argument('--name', type=str, nargs='+', required=True)
+    parser.add_argument('--method', type=str, required=False, default=None)
+    args = parser.parse_args()
+    for name in args.name:
+        convert_text(name, args.method)
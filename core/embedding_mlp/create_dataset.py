@@ -201,6 +201,7 @@ def save_dataset(embedding_model_name, cfg, args):
     for run_id, seed, split_index in zip(*run_loop_settings(cfg, args)):
         print(f'run id : {run_id}, seed: {seed}, split_index: {split_index}')
         cfg.seed = seed
+        cfg.data.seed = seed
         cfg.run_id = run_id
         seed_everything(cfg.seed)
         splits, text, _ = load_data_lp[cfg.data.name](cfg.data)
@@ -351,6 +352,7 @@ def list2csr(lst: List):
  
 def create_tfidf(cfg, seed):
     seed_everything(seed)
+    cfg.data.seed = seed
     cfg.data.method = cfg.embedder.type
     splits, text, _ = load_data_lp[cfg.data.name](cfg.data)
     splits = random_sampling(splits, cfg.data.scale)
@@ -238,6 +238,7 @@ def project_main():
         custom_set_run_dir(cfg, cfg.wandb.name_tag)
 
         cfg.seed = seed
+        cfg.data.seed = seed
         cfg.run_id = run_id
         seed_everything(cfg.seed)
 
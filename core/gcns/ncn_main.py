@@ -110,6 +110,7 @@ if __name__ == "__main__":
         custom_set_run_dir(cfg, run_id)
         print_logger = set_printing(cfg)
         cfg.seed = seed
+        cfg.data.seed = seed
         cfg.run_id = run_id
         seed_everything(cfg.seed)
         cfg = config_device(cfg)
@@ -104,6 +104,7 @@ if __name__ == "__main__":
         set_printing(cfg)
         print_logger = set_printing(cfg)
         cfg.seed = seed
+        cfg.data.seed = seed
         cfg.run_id = run_id
         seed_everything(cfg.seed)
         cfg = config_device(cfg)
@@ -93,6 +93,7 @@ if __name__ == "__main__":
         custom_set_run_dir(cfg, run_id)
         set_printing(cfg)
         cfg.seed = seed
+        cfg.data.seed = seed
         cfg.run_id = run_id
         seed_everything(cfg.seed)
         cfg = config_device(cfg)
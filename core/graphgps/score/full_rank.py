@@ -0,0 +1,127 @@
+"""
+Full-ranking evaluation of decoder based link predictors.
+Every query (source, target) is ranked against all N nodes instead of a sampled negative set. The candidates
+are scored in blocks that fit a fixed memory budget, known edges are filtered out, the rank of the target is
+counted block by block and a running top-k of every query is kept, so the N scores of a query never coexist.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from typing import Callable, Dict, Sequence, Tuple
+
+import numpy as np
+import scipy.sparse as ssp
+import torch
+from torch_geometric.nn import InnerProductDecoder
+from tqdm import tqdm
+
+from graphgps.score.custom_score import InnerProduct
+
+
+def block_scorer(decoder: Callable) -> Tuple[Callable, bool]:
+    """
+    :param decoder: InnerProduct / InnerProductDecoder (GAE), or any pairwise predictor decoder(x, y) -> scores,
+                    e.g. mlp_score, LinkPredictor or the MLPs on LLM embeddings
+    :return: score(h_query [B, d], h_cand [C, d]) -> [B, C] scores, and whether it is a single matmul
+    """
+    if isinstance(decoder, (InnerProduct, InnerProductDecoder)):
+        def score(h_query, h_cand):
+            return torch.sigmoid(h_query @ h_cand.t())
+        return score, True
+
+    def score(h_query, h_cand):
+        num_query, num_cand = h_query.size(0), h_cand.size(0)
+        x = h_query.repeat_interleave(num_cand, dim=0)
+        y = h_cand.repeat(num_query, 1)
+        return decoder(x, y).view(num_query, num_cand)
+    return score, False
+
+
+def _filter_csr(filter_edge_index: torch.Tensor, num_nodes: int) -> ssp.csr_matrix:
+    edges = torch.as_tensor(filter_edge_index).cpu().numpy()
+    return ssp.csr_matrix((np.ones(edges.shape[1], dtype=bool), (edges[0], edges[1])),
+                          shape=(num_nodes, num_nodes))
+
+
+@torch.no_grad()
+def full_rank(decoder: Callable, h: torch.Tensor, pos_edge: torch.Tensor, filter_edge_index: torch.Tensor = None,
+              k: int = 100, k_list: Sequence[int] = (1, 3, 10, 20, 50, 100), query_batch: int = 256,
+              max_memory: int = 2 ** 28, exclude_self: bool = True) -> Tuple[Dict[str, float], torch.Tensor, torch.Tensor]:
+    """
+    Filtered full ranking: the target of every query is ranked against all nodes that are neither a known positive
+    of the source (filter_edge_index and the other queries) nor the source itself, ties share the mean rank as in
+    eval_mrr.
+    :param decoder: see block_scorer
+    :param h: node embeddings of the encoder (torch.Tensor of shape [N, d])
+    :param pos_edge: pyg edge_index of the queries (torch.Tensor of shape [2, Q]), source and target
+    :param filter_edge_index: pyg edge_index of the known edges, e.g. the training edges and the valid / test
+                              positives, the queries pos_edge are always filtered as well
+    :param k: size of the top-k list kept per query
+    :param query_batch: number of queries scored together
+    :param max_memory: bytes of the largest intermediate tensor of one block, bounds the peak memory
+    :return: MRR and mrr_hit@K, the top-k candidates [Q, k] and their scores [Q, k], slots left over when a
+             query has fewer than k unfiltered candidates hold index -1 and score -inf
+    """
+    num_nodes, dim = h.size(0), h.size(1)
+    score, is_matmul = block_scorer(decoder)
+    if isinstance(decoder, torch.nn.Module):
+        decoder.eval()
+    # one float per pair for a matmul, the pair embeddings and a hidden layer of the same size otherwise
+    pair_bytes = h.element_size() * (1 if is_matmul else 3 * dim)
+    block_size = max(1, min(num_nodes, max_memory // (pair_bytes * query_batch)))
+    known = pos_edge if filter_edge_index is None else torch.cat([filter_edge_index.to(pos_edge.device), pos_edge], 1)
+    filt = _filter_csr(known, num_nodes)
+
+    pos_edge = pos_edge.to(h.device)
+    ranks, topk_index, topk_score = [], [], []
+    for q in tqdm(torch.split(torch.arange(pos_edge.size(1), device=h.device), query_batch)):
+        src, dst = pos_edge[0, q], pos_edge[1, q]
+        h_src = h[src]
+        # the diagonal of a small matmul keeps the positive scores bit-identical to the block scores
+        pos_score = score(h_src, h[dst]).diagonal() if is_matmul else decoder(h_src, h[dst])
+        pos_score = pos_score.to(h.dtype).view(-1, 1)
+
+        # known edges of the batch as (row in batch, node), the target of the query is excluded as well
+        rows = [torch.arange(q.numel(), device=h.device)]
+        cols = [dst]
+        if exclude_self:
+            rows.append(rows[0])
+            cols.append(src)
+        src_np = src.cpu().numpy()
+        starts, ends = filt.indptr[src_np], filt.indptr[src_np + 1]
+        lens = torch.from_numpy(ends - starts)
+        pos = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)] + [np.zeros(0, dtype=np.int64)])
+        rows.append(torch.repeat_interleave(rows[0].cpu(), lens).to(h.device))
+        cols.append(torch.from_numpy(filt.indices[pos].astype(np.int64)).to(h.device))
+        rows, cols = torch.cat(rows), torch.cat(cols)
+
+        above = torch.zeros(q.numel(), dtype=torch.long, device=h.device)
+        at_least = torch.zeros_like(above)
+        best_score = h.new_full((q.numel(), 0), float('-inf'))
+        best_index = torch.zeros((q.numel(), 0), dtype=torch.long, device=h.device)
+        for c0 in range(0, num_nodes, block_size):
+            c1 = min(c0 + block_size, num_nodes)
+            cur = score(h_src, h[c0:c1]).to(h.dtype)
+            in_block = (cols >= c0) & (cols < c1)
+            cur[rows[in_block], cols[in_block] - c0] = float('-inf')
+
+            above += (cur > pos_score).sum(1)
+            at_least += (cur >= pos_score).sum(1)
+            # running top-k over the blocks seen so far
+            best_score = torch.cat([best_score, cur], 1)
+            best_index = torch.cat([best_index, torch.arange(c0, c1, device=h.device).expand(q.numel(), -1)], 1)
+            best_score, idx = torch.topk(best_score, min(k, best_score.size(1)), dim=1)
+            best_index = best_index.gather(1, idx)
+
+        ranks.append(0.5 * (above + at_least).double() + 1)
+        # filtered candidates only reach the top-k when too few are left, they are not results
+        best_index[torch.isneginf(best_score)] = -1
+        topk_index.append(best_index.cpu())
+        topk_score.append(best_score.cpu())
+
+    ranking_list = torch.cat(ranks)
+    results = {'MRR': round((1. / ranking_list).mean().item(), 4)}
+    for K in k_list:
+        results[f'mrr_hit{K}'] = round((ranking_list <= K).double().mean().item(), 4)
+    print(f'full ranking of {ranking_list.numel()} queries against {num_nodes} nodes in blocks of {block_size}')
+    return results, torch.cat(topk_index), torch.cat(topk_score)
@@ -16,7 +16,7 @@ import torch.nn.functional as F
 
 # external 
 from graph_embed.tune_utils import param_tune_acc_mrr, mvari_str2csv, save_parmet_tune
-from heuristic.eval import get_metric_score
+from heuristic.eval import fused_metric_score
 from graphgps.utility.utils import config_device, Logger
 from typing import Dict, Tuple
 
@@ -168,21 +168,7 @@ class Trainer_Saint(Trainer):
             z = self.model.encoder(data.x, data.edge_index)
             pos_pred = self.model.decoder(z[local_pos_indices[0]], z[local_pos_indices[1]])
             neg_pred = self.model.decoder(z[local_neg_indices[0]], z[local_neg_indices[1]])
-            y_pred = torch.cat([pos_pred, neg_pred], dim=0)
-
-            hard_thres = (y_pred.max() + y_pred.min())/2
-
-            pos_y = z.new_ones(local_pos_indices.size(1))
-            neg_y = z.new_zeros(local_neg_indices.size(1)) 
-            y = torch.cat([pos_y, neg_y], dim=0)
-            
-            y_pred[y_pred >= hard_thres] = 1
-            y_pred[y_pred < hard_thres] = 0
-            acc = torch.sum(y == y_pred) / len(y)
-
-            pos_pred, neg_pred = pos_pred.cpu(), neg_pred.cpu()
-            result_mrr = get_metric_score(self.evaluator_hit, self.evaluator_mrr, pos_pred, neg_pred)
-            result_mrr.update({'ACC': round(acc.item(), 5)})
+            result_mrr = fused_metric_score(pos_pred, neg_pred)
             accumulated_metrics.append(result_mrr)
 
         # Aggregate results from accumulated_metrics
@@ -213,21 +199,7 @@ class Trainer_Saint(Trainer):
             z = self.model(data.x, data.edge_index)
             pos_pred = self.model.decoder(z, local_pos_indices)
             neg_pred = self.model.decoder(z, local_neg_indices)
-            y_pred = torch.cat([pos_pred, neg_pred], dim=0)
-
-            hard_thres = (y_pred.max() + y_pred.min())/2
-
-            pos_y = z.new_ones(local_pos_indices.size(1))
-            neg_y = z.new_zeros(local_neg_indices.size(1)) 
-            y = torch.cat([pos_y, neg_y], dim=0)
-            
-            y_pred[y_pred >= hard_thres] = 1
-            y_pred[y_pred < hard_thres] = 0
-            acc = torch.sum(y == y_pred) / len(y)
-            
-            pos_pred, neg_pred = pos_pred.cpu(), neg_pred.cpu()
-            result_mrr = get_metric_score(self.evaluator_hit, self.evaluator_mrr, pos_pred, neg_pred)
-            result_mrr.update({'ACC': round(acc.item(), 5)})
+            result_mrr = fused_metric_score(pos_pred, neg_pred)
             accumulated_metrics.append(result_mrr)
 
         # Aggregate results from accumulated_metrics
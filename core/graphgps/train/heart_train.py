@@ -14,7 +14,9 @@ from torch_geometric.utils import negative_sampling
 from torch_geometric.graphgym.config import cfg
 from torch_sparse import SparseTensor
 
-from heuristic.eval import get_metric_score
+from heuristic.eval import get_metric_score, fused_metric_score
+from heuristic.rank_artifact import save_rank_artifact
+from heuristic.threshold import threshold_metrics
 from torch.utils.data import DataLoader
 from torch_geometric.utils import negative_sampling
 from torch_geometric.data import Data
@@ -227,6 +229,8 @@ class Trainer_Heart(Trainer):
                           drop_last=True) 
         self.out_dir = cfg.out_dir
         self.run_dir = cfg.run_dir
+        # opt-in per-edge scores and ranks of the last epoch for analysis/visual.py, next to the error csv
+        self.rank_artifact = cfg.train.get('rank_artifact', False)
         if if_wandb:
             self.step = 0
         
@@ -314,21 +318,16 @@ class Trainer_Heart(Trainer):
         neg_edge_index = data.neg_edge_label_index
 
         if self.model_name == 'VGAE':
-            z = self.model(data.x, data.edge_index)
+            z = self.encode(self.model, data.x, data.edge_index)
             
         elif self.model_name in ['GAE', 'GAT', 'GraphSage', 'GAT_Variant', 
                                  'GCN_Variant', 'SAGE_Variant', 'GIN_Variant']:
-            z = self.model.encoder(data.x, data.edge_index)
+            z = self.encode(self.model.encoder, data.x, data.edge_index)
         
         pos_pred = self.test_edge(z, pos_edge_index)
         neg_pred = self.test_edge(z, neg_edge_index)
         
-        acc = self._acc(pos_pred, neg_pred)
-        
-        pos_pred, neg_pred = pos_pred.cpu(), neg_pred.cpu()
-        result_mrr = get_metric_score(self.evaluator_hit, self.evaluator_mrr, pos_pred.squeeze(), neg_pred.squeeze())
-        result_mrr.update({'ACC': round(acc, 5)})
-        return result_mrr
+        return fused_metric_score(pos_pred.squeeze(), neg_pred.squeeze())
     
     @torch.no_grad()
     def save_eval_edge_pred(self, h, edge_index):
@@ -348,15 +347,20 @@ class Trainer_Heart(Trainer):
         self.model.eval()
 
         if self.model_name == 'VGAE':
-            z = self.model(data.x, data.edge_index)
+            z = self.encode(self.model, data.x, data.edge_index)
             
         elif self.model_name in ['GAE', 'GAT', 'GraphSage', 'GAT_Variant', 
                                  'GCN_Variant', 'SAGE_Variant', 'GIN_Variant']:
-            z = self.model.encoder(data.x, data.edge_index)
+            z = self.encode(self.model.encoder, data.x, data.edge_index)
         
         pos_pred, pos_edge_index = self.save_eval_edge_pred(z, data.pos_edge_label_index)
         neg_pred, neg_edge_index = self.save_eval_edge_pred(z, data.neg_edge_label_index)
         self._acc_error_save(pos_pred, pos_edge_index, neg_pred, neg_edge_index, mode)
+        self.print_logger.info(f'{mode} thresholds and calibration: {threshold_metrics(pos_pred, neg_pred)}')
+        if self.rank_artifact:
+            save_rank_artifact(f'{self.run_dir}/{self.data_name}_{mode}_ranks',
+                               pos_edge_index, pos_pred.squeeze(), neg_edge_index, neg_pred.squeeze(),
+                               meta={'model': self.model_name, 'data': self.data_name, 'mode': mode})
 
     
     def _acc_error_save(self, 
@@ -428,11 +432,14 @@ class Trainer_Heart(Trainer):
                         wandb.log({f"Metrics/test_{key}": test_hits}, step=self.step)
                     
                 self.print_logger.info('---')
+                if self.early_stop(epoch):
+                    break
                 
             if self.if_wandb:
                 self.step += 1
             self.tensorboard_writer.flush()
         self.tensorboard_writer.close()
+        self.restore_best()
     
     def finalize(self):
         for _ in range(1):
@@ -441,8 +448,11 @@ class Trainer_Heart(Trainer):
             self.run_result['train_time'] = time.time() - start_train
             self.evaluate_func[self.model_name](self.test_data)
             self.run_result['eval_time'] = time.time() - start_train
+        # the timing step above updates the weights, the errors are saved for the best epoch
+        self.restore_best()
         
-        self._save_err_heart(self.test_data, 'test')
-        self._save_err_heart(self.valid_data, 'valid')
-        self._save_err_heart(self.train_data,  'train')
+        with self.eval_context():
+            self._save_err_heart(self.test_data, 'test')
+            self._save_err_heart(self.valid_data, 'valid')
+            self._save_err_heart(self.train_data,  'train')
             
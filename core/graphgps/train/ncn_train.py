@@ -21,7 +21,7 @@ import numpy as np
 from torch_geometric.data import Data
 from torch_geometric.loader import DataLoader
 from graph_embed.tune_utils import param_tune_acc_mrr
-from heuristic.eval import get_metric_score
+from heuristic.eval import StreamingMetricScore
 from graphgps.utility.utils import config_device, Logger
 from typing import Dict, Tuple
 from graphgps.train.opt_train import (Trainer)
@@ -192,35 +192,19 @@ class Trainer_NCN(Trainer):
         neg_edge = eval_data['neg_edge_label_index'].to(self.device)
         if eval_data == self.test_data:
             adj = self.data.full_adj_t
-            h = self.model(self.data.x, adj)
         else:
             adj = self.data.adj_t
-            h = self.model(self.data.x, adj)
-        pos_pred = torch.cat([self.predictor(h, adj, pos_edge[perm]).squeeze().cpu()
-            for perm in PermIterator(pos_edge.device, pos_edge.shape[0], self.batch_size, False)],dim=0)
-
-        neg_pred = torch.cat([self.predictor(h, adj, neg_edge[perm]).squeeze().cpu()
-            for perm in PermIterator(neg_edge.device, neg_edge.shape[0], self.batch_size, False)],dim=0)
-
-        y_pred = torch.cat([pos_pred, neg_pred], dim=0)
-        hard_thres = (y_pred.max() + y_pred.min()) / 2
-        pos_y = torch.ones(pos_edge.size(1))
-        neg_y = torch.zeros(neg_edge.size(1))
-        y_true = torch.cat([pos_y, neg_y], dim=0)
-        '''self.save_pred(y_pred, y_true, eval_data)'''
-
-        pos_pred, neg_pred = y_pred[y_true == 1].cpu(), y_pred[y_true == 0].cpu()
-        y_pred = torch.where(y_pred >= hard_thres, torch.tensor(1), torch.tensor(0))
-
-        y_true = y_true.clone().detach()
-        y_pred = y_pred.clone().detach()
-
-        acc = torch.sum(y_true == y_pred) / len(y_true)
-
-        result_mrr = get_metric_score(self.evaluator_hit, self.evaluator_mrr, pos_pred, neg_pred)
-        result_mrr.update({'ACC': round(acc.tolist(), 5)})
-
-        return result_mrr
+        # valid and train share adj_t and its node embeddings within merge_result_rank
+        h = self.encode(self.model, self.data.x, adj)
+        # feed the scores batch by batch instead of concatenating every prediction of the split
+        self._log_binned_acc()
+        metrics = StreamingMetricScore()
+        for perm in PermIterator(pos_edge.device, pos_edge.shape[0], self.batch_size, False):
+            metrics.add_pos(self.predictor(h, adj, pos_edge[perm]).squeeze())
+        for perm in PermIterator(neg_edge.device, neg_edge.shape[0], self.batch_size, False):
+            metrics.add_neg(self.predictor(h, adj, neg_edge[perm]).squeeze())
+
+        return metrics.compute()
 
     def finalize(self):
         import time
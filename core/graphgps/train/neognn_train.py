@@ -14,7 +14,7 @@ from torch_geometric.graphgym.config import cfg
 from yacs.config import CfgNode as CN
 from torch_geometric.data import Data
 from torch_geometric.loader import DataLoader
-from heuristic.eval import get_metric_score
+from heuristic.eval import fused_metric_score
 from graphgps.utility.utils import config_device, Logger
 from typing import Dict, Tuple
 from graphgps.train.opt_train import (Trainer)
@@ -212,27 +212,7 @@ class Trainer_NeoGNN(Trainer):
         # Concatenate predictions and create labels
         pos_pred = torch.cat(pos_pred_list, dim=0)
         neg_pred = torch.cat(neg_pred_list, dim=0)
-        y_pred = torch.cat([pos_pred, neg_pred], dim=0)
-
-        hard_thres = (y_pred.max() + y_pred.min()) / 2
-
-        # Create true labels
-        pos_y = torch.ones(pos_pred.size(0))
-        neg_y = torch.zeros(neg_pred.size(0))
-        y_true = torch.cat([pos_y, neg_y], dim=0)
-
-        # Convert predictions to binary labels
-        y_pred_binary = torch.where(y_pred >= hard_thres, torch.tensor(1), torch.tensor(0))
-
-        # Move to CPU for evaluation
-        y_true = y_true.cpu()
-        y_pred_binary = y_pred_binary.cpu()
-
-        acc = torch.sum(y_true == y_pred_binary).item() / len(y_true)
-
-        # Assuming get_metric_score is defined elsewhere and computes metrics
-        result_mrr = get_metric_score(self.evaluator_hit, self.evaluator_mrr, pos_pred, neg_pred)
-        result_mrr.update({'ACC': round(acc, 5)})
+        result_mrr = fused_metric_score(pos_pred, neg_pred)
 
         return result_mrr
 
@@ -6,6 +6,7 @@ sys.path.insert(0, abspath(join(dirname(dirname(__file__)))))
 import torch
 import time
 import wandb 
+from contextlib import contextmanager
 import numpy as np
 from ogb.linkproppred import Evaluator
 from torch_geometric.graphgym.config import cfg
@@ -13,11 +14,13 @@ from sklearn.metrics import roc_auc_score, average_precision_score, roc_curve, a
 from yacs.config import CfgNode as CN
 from tqdm import tqdm 
 from torch_geometric.data import Data
+from torch_geometric.utils import is_undirected
 
 from graph_embed.tune_utils import mvari_str2csv, save_parmet_tune
-from heuristic.eval import get_metric_score
+from heuristic.eval import StreamingMetricScore
+from graphgps.score.full_rank import full_rank
 from graphgps.utility.utils import config_device, Logger
-from typing import Dict, Tuple
+from typing import Callable, Dict, Tuple
 
 
 
@@ -66,7 +69,17 @@ class Trainer():
                 'ogbn-products': 1,
         }
 
-        self.report_step = report_step[cfg.data.name]
+        # cfg.train.eval_step overrides the evaluation cadence of the dataset
+        self.report_step = cfg.train.get('eval_step', None) or report_step[cfg.data.name]
+        # evaluate the train split on a fixed random subsample of eval_train_size positives and negatives
+        self.eval_train_size = cfg.train.get('eval_train_size', None)
+        self.eval_seed = cfg.get('seed', 0)
+        self._train_eval_split = None
+        # stop after patience evaluations without improvement of es_metric on valid, None trains all epochs
+        self.patience = cfg.train.get('patience', None)
+        self.es_metric = cfg.train.get('es_metric', 'Hits@100')
+        self.best_valid, self.best_epoch, self.best_state = None, 0, None
+        self.bad_evals = 0
         
         self.model_types = ['VGAE', 'GAE', 'GAT', 'GraphSage']
         
@@ -126,6 +139,38 @@ class Trainer():
         return roc_auc_score(y, pred), average_precision_score(y, pred), auc(fpr, tpr)
 
 
+    @contextmanager
+    def eval_context(self):
+        """
+        Within the context the encoder runs once per distinct message passing graph and every split evaluated
+        on the same graph reuses its output, the weights must not change inside the context.
+        """
+        self._encoder_cache = []
+        try:
+            yield
+        finally:
+            self._encoder_cache = None
+
+    @staticmethod
+    def _same_graph(a, b) -> bool:
+        if a is b:
+            return True
+        # the splits of RandomLinkSplit hold equal copies of the graph, other graph types match by identity only
+        return isinstance(a, torch.Tensor) and isinstance(b, torch.Tensor) and a.shape == b.shape \
+            and a.dtype == b.dtype and a.device == b.device and torch.equal(a, b)
+
+    def encode(self, forward: Callable, x: torch.Tensor, graph) -> torch.Tensor:
+        """forward(x, graph), served from the cache of eval_context for a graph that was encoded before"""
+        cache = getattr(self, '_encoder_cache', None)
+        if cache is None:
+            return forward(x, graph)
+        for cached_forward, cached_x, cached_graph, h in cache:
+            if cached_forward == forward and self._same_graph(cached_x, x) and self._same_graph(cached_graph, graph):
+                return h
+        h = forward(x, graph)
+        cache.append((forward, x, graph, h))
+        return h
+
     @torch.no_grad()
     def _evaluate(self, data: Data):
        
@@ -133,41 +178,36 @@ class Trainer():
         pos_edge_index = data.pos_edge_label_index
         neg_edge_index = data.neg_edge_label_index
 
-        z = self.model.encoder(data.x, data.edge_index)
-        pos_pred = self.model.decoder(z, pos_edge_index)
-        neg_pred = self.model.decoder(z, neg_edge_index)
-        
-        # add a visualization of the threshold
-
-        acc = self._acc(pos_pred, neg_pred)
-        
-        pos_pred, neg_pred = pos_pred.cpu(), neg_pred.cpu()
-        result_mrr = get_metric_score(self.evaluator_hit, self.evaluator_mrr, pos_pred, neg_pred)
-        result_mrr.update({'ACC': round(acc.tolist(), 5)})
+        z = self.encode(self.model.encoder, data.x, data.edge_index)
+        return self._stream_metrics(z, pos_edge_index, neg_edge_index)
+
+    def _stream_metrics(self, z, pos_edge_index, neg_edge_index):
+        # decode batch by batch, the split is never concatenated
+        self._log_binned_acc()
+        metrics = StreamingMetricScore()
+        for edge in torch.split(pos_edge_index, self.batch_size, dim=1):
+            metrics.add_pos(self.model.decoder(z, edge))
+        for edge in torch.split(neg_edge_index, self.batch_size, dim=1):
+            metrics.add_neg(self.model.decoder(z, edge))
+        return metrics.compute()
     
-        return result_mrr
-    
-    def _acc(self, pos_pred, neg_pred):
-        hard_thres = (max(torch.max(pos_pred).item(), torch.max(neg_pred).item()) + min(torch.min(pos_pred).item(), torch.min(neg_pred).item())) / 2
-
-        # Initialize predictions with zeros and set ones where condition is met
-        y_pred = torch.zeros_like(pos_pred)
-        y_pred[pos_pred >= hard_thres] = 1
-
-        # Do the same for negative predictions
-        neg_y_pred = torch.ones_like(neg_pred)
-        neg_y_pred[neg_pred <= hard_thres] = 0
-
-        # Concatenate the positive and negative predictions
-        y_pred = torch.cat([y_pred, neg_y_pred], dim=0)
+    @torch.no_grad()
+    def full_rank_eval(self, data: Data, k: int = 100, max_memory: int = 2 ** 28):
+        """filtered MRR of the positives of data against all nodes, every known positive is filtered out"""
+        self.model.eval()
+        z = self.model(data.x, data.edge_index) if self.model_name == 'VGAE' else self.model.encoder(data.x, data.edge_index)
+        known = [self.train_data.edge_index] + [split.pos_edge_label_index for split in (self.valid_data, self.test_data)]
+        known = torch.cat([edge.to(z.device) for edge in known], 1)
+        if is_undirected(self.train_data.edge_index):
+            known = torch.cat([known, known.flip(0)], 1)
+        result, _, _ = full_rank(self.model.decoder, z, data.pos_edge_label_index,
+                                 known, k=k, max_memory=max_memory)
+        return result
 
-        # Initialize ground truth labels
-        pos_y = torch.ones_like(pos_pred)
-        neg_y = torch.zeros_like(neg_pred)
-        y = torch.cat([pos_y, neg_y], dim=0)
-        y_logits = torch.cat([pos_pred, neg_pred], dim=0)
-        # Calculate accuracy    
-        return (y == y_pred).float().mean().item()
+    def _log_binned_acc(self):
+        # StreamingMetricScore reports ACC_binned, the shared loggers of the runs track it in place of ACC
+        if 'ACC' in self.loggers:
+            self.loggers['ACC_binned'] = self.loggers.pop('ACC')
 
 
     @torch.no_grad()
@@ -177,38 +217,80 @@ class Trainer():
         pos_edge_index = data.pos_edge_label_index
         neg_edge_index = data.neg_edge_label_index
 
-        z = self.model(data.x, data.edge_index)
-        pos_pred = self.model.decoder(z, pos_edge_index)
-        neg_pred = self.model.decoder(z, neg_edge_index)
-        y_pred = torch.cat([pos_pred, neg_pred], dim=0)
-        
-        hard_thres = (y_pred.max() + y_pred.min())/2
+        z = self.encode(self.model, data.x, data.edge_index)
+        return self._stream_metrics(z, pos_edge_index, neg_edge_index)
+    
 
-        pos_y = z.new_ones(pos_edge_index.size(1))
-        neg_y = z.new_zeros(neg_edge_index.size(1)) 
-        y = torch.cat([pos_y, neg_y], dim=0)
-        
-        y_pred[y_pred >= hard_thres] = 1
-        y_pred[y_pred < hard_thres] = 0
+    def _train_eval_data(self):
+        """the train split for evaluation, a subsample drawn once so that epochs stay comparable"""
+        # trainers with their own __init__ evaluate the whole split
+        if getattr(self, 'eval_train_size', None) is None or not isinstance(self.train_data, Data) \
+                or 'pos_edge_label_index' not in self.train_data:
+            return self.train_data
+        if self._train_eval_split is None:
+            generator = torch.Generator().manual_seed(self.eval_seed)
+            split = self.train_data.clone()
+            for key in ['pos_edge_label', 'neg_edge_label']:
+                if f'{key}_index' not in split:
+                    continue
+                num_edges = split[f'{key}_index'].size(1)
+                if num_edges <= self.eval_train_size:
+                    continue
+                perm = torch.randperm(num_edges, generator=generator)[:self.eval_train_size]
+                perm = perm.to(split[f'{key}_index'].device)
+                split[f'{key}_index'] = split[f'{key}_index'][:, perm]
+                if key in split:
+                    split[key] = split[key][perm]
+            self._train_eval_split = split
+        return self._train_eval_split
 
-        acc = torch.sum(y == y_pred)/len(y)
-        
-        pos_pred, neg_pred = pos_pred.cpu(), neg_pred.cpu()
-        result_mrr = get_metric_score(self.evaluator_hit, self.evaluator_mrr, pos_pred, neg_pred)
-        result_mrr.update({'ACC': round(acc.tolist(), 5)})
-    
-        return result_mrr
-    
 
     def merge_result_rank(self):
-        result_test = self.evaluate_func[self.model_name](self.test_data)
-        result_valid = self.evaluate_func[self.model_name](self.valid_data)
-        result_train = self.evaluate_func[self.model_name](self.train_data)
+        with self.eval_context():
+            result_test = self.evaluate_func[self.model_name](self.test_data)
+            result_valid = self.evaluate_func[self.model_name](self.valid_data)
+            result_train = self.evaluate_func[self.model_name](self._train_eval_data())
 
         return {
             key: (result_train[key], result_valid[key], result_test[key])
             for key in result_test.keys()
         }
+
+
+    def _trained_modules(self) -> Dict[str, torch.nn.Module]:
+        return {name: getattr(self, name) for name in ['model', 'predictor']
+                if isinstance(getattr(self, name, None), torch.nn.Module)}
+
+
+    def early_stop(self, epoch: int) -> bool:
+        """
+        Track the best validation es_metric of self.results_rank and keep a copy of its weights,
+        only when cfg.train.patience is set, the default trains all epochs and keeps the last weights.
+        :return: True once the metric has not improved for self.patience evaluations
+        """
+        if getattr(self, 'patience', None) is None:
+            return False
+        valid = self.results_rank[self.es_metric][1]
+        if self.best_valid is None or valid > self.best_valid:
+            self.best_valid, self.best_epoch, self.bad_evals = valid, epoch, 0
+            self.best_state = {name: {k: v.detach().cpu().clone() for k, v in module.state_dict().items()}
+                               for name, module in self._trained_modules().items()}
+            return False
+        self.bad_evals += 1
+        if self.bad_evals >= self.patience:
+            self.print_logger.info(f'Early stopping at epoch {epoch:03d}, best valid {self.es_metric} '
+                                   f'{self.best_valid:.4f} at epoch {self.best_epoch:03d}')
+            return True
+        return False
+
+
+    def restore_best(self):
+        """load the weights of the best validation epoch seen by early_stop, a no-op without patience"""
+        if getattr(self, 'patience', None) is None or self.best_state is None:
+            return
+        for name, module in self._trained_modules().items():
+            module.load_state_dict(self.best_state[name])
+        self.print_logger.info(f'Restored weights of epoch {self.best_epoch:03d}')
     
     
     def train(self):  
@@ -239,6 +321,8 @@ class Trainer():
                         wandb.log({f"Metrics/test_{key}": test_hits})
                     
                 self.print_logger.info('---')
+                if self.early_stop(epoch):
+                    break
 
         for _ in range(1):
             start_train = time.time() 
@@ -246,6 +330,7 @@ class Trainer():
             self.run_result['train_time'] = time.time() - start_train
             self.evaluate_func[self.model_name](self.test_data)
             self.run_result['eval_time'] = time.time() - start_train
+        self.restore_best()
 
 
     def result_statistic(self):
@@ -19,7 +19,7 @@ from graphgps.utility.utils import Logger, config_device
 
 from torch_geometric.data import Data
 from torch_geometric.loader import DataLoader
-from heuristic.eval import get_metric_score
+from heuristic.eval import fused_metric_score
 from graphgps.train.opt_train import Trainer
 from graphgps.train.heart_train import Trainer_Heart
 from typing import Any, List, Optional, Sequence, Union, Dict
@@ -170,18 +170,8 @@ class Trainer_SEAL(Trainer):
         y_true = torch.cat(y_true, dim=0)
         y_pred, y_true = y_pred.cpu(), y_true.cpu()
 
-        hard_thres = (y_pred.max() + y_pred.min()) / 2
-
-        pos_pred, neg_pred = y_pred[y_true == 1].cpu(), y_pred[y_true == 0].cpu()
-        y_pred = torch.where(y_pred >= hard_thres, torch.tensor(1), torch.tensor(0))
-
-        y_true = y_true.clone().detach()
-        y_pred = y_pred.clone().detach()
-
-        acc = torch.sum(y_true == y_pred) / len(y_true)
-
-        result_mrr = get_metric_score(self.evaluator_hit, self.evaluator_mrr, pos_pred, neg_pred)
-        result_mrr.update({'ACC': round(acc.tolist(), 5)})
+        pos_pred, neg_pred = y_pred[y_true == 1], y_pred[y_true == 0]
+        result_mrr = fused_metric_score(pos_pred, neg_pred)
 
         return result_mrr
 
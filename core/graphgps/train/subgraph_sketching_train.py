@@ -23,7 +23,7 @@ import numpy as np
 from torch_geometric.data import Data
 from torch_geometric.loader import DataLoader
 from graph_embed.tune_utils import param_tune_acc_mrr
-from heuristic.eval import get_metric_score
+from heuristic.eval import fused_metric_score
 from graphgps.utility.utils import config_device, Logger
 from typing import Dict, Tuple
 from graphgps.train.opt_train import (Trainer)
@@ -183,21 +183,12 @@ class Trainer_Subgraph_Sketching(Trainer):
 
 
         y_pred = y_pred.view(-1).cpu()
-        hard_thres = (y_pred.max() + y_pred.min()) / 2
         pos_y = torch.ones(pos_train_edge.size(0))
         neg_y = torch.zeros(neg_train_edge.size(0))
         y_true = torch.cat([pos_y, neg_y], dim=0)
 
-        pos_pred, neg_pred = y_pred[y_true == 1].cpu(), y_pred[y_true == 0].cpu()
-        y_pred = torch.where(y_pred >= hard_thres, torch.tensor(1), torch.tensor(0))
-
-        y_true = y_true.clone().detach().cpu()
-        y_pred = y_pred.clone().detach().cpu()
-
-        acc = torch.sum(y_true == y_pred) / len(y_true)
-
-        result_mrr = get_metric_score(self.evaluator_hit, self.evaluator_mrr, pos_pred, neg_pred)
-        result_mrr.update({'ACC': round(acc.tolist(), 5)})
+        pos_pred, neg_pred = y_pred[y_true == 1], y_pred[y_true == 0]
+        result_mrr = fused_metric_score(pos_pred, neg_pred)
 
         return result_mrr
     def finalize(self):
@@ -13,9 +13,12 @@ from data_utils.load_data_nc import (
     load_graph_cora, 
     load_graph_pubmed, 
     load_tag_arxiv23, 
-    load_graph_ogbn-arxiv
+    load_graph_ogbn_arxiv
 )
 from graphgps.encoder.seal import do_edge_split, do_ogb_edge_split
+from heuristic.gsf import shortest_path_distance
+from heuristic.score_store import HeuristicScoreStore
+from heuristic.query_rank import score_queries
 from torch_geometric.utils import to_scipy_sparse_matrix
 from ogb.linkproppred import PygLinkPropPredDataset, Evaluator
 from torch_geometric.datasets import Planetoid
@@ -23,13 +26,14 @@ from torch_geometric.utils import (negative_sampling, add_self_loops,
                                    train_test_split_edges)
 
 from torch_geometric.loader import DataLoader
+from torch_geometric import seed_everything
 from tqdm import tqdm 
 
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 
-def load_graph(dataset: str):
+def load_graph(dataset: str, val_pct: float = 0.05, test_pct: float = 0.1):
     if dataset == 'custom-pubmed':
         data = load_graph_pubmed(False)
     elif dataset == 'custom-cora':
@@ -37,10 +41,10 @@ def load_graph(dataset: str):
     elif dataset == 'custom-arxiv_2023':
         data, _ = load_tag_arxiv23()
     elif dataset == 'custom-ogbn-arxiv':
-        data = load_graph_ogbn-arxiv(False)
+        data = load_graph_ogbn_arxiv(False)
     
     if dataset.startswith('custom'):
-        split_edge = do_ogb_edge_split(cp.deepcopy(data), fast_split)
+        split_edge = do_ogb_edge_split(cp.deepcopy(data), fast_split, val_pct, test_pct)
         return data, split_edge
     
     if dataset.startswith('ogbl'):
@@ -56,7 +60,7 @@ def load_graph(dataset: str):
         path = osp.join('generated_dataset', dataset)
         data = Planetoid(path, dataset)
         data = data[0]
-        split_edge = do_ogb_edge_split(data, fast_split)
+        split_edge = do_ogb_edge_split(data, fast_split, val_pct, test_pct)
         data.edge_index = split_edge['train']['edge'].t()
     return data, split_edge
 
@@ -150,68 +154,47 @@ def CN_citation2(A, edge_index: Dict, batch_size=100000):
 
 
    
-def shortest_path(G, edge_index, remove=False):
-
-    scores = []
-    count = 0
+def shortest_path(A, edge_index, remove=False):
+    """
+    exp(-(sp - 1)) of the shortest path length on the undirected graph of A, see shortest_path_distance
+    :param A: scipy sparse adjacency matrix
+    :param edge_index: pyg edge_index of shape [num_edges, 2]
+    :return: FloatTensor [edges] of scores
+    """
     print('remove: ', remove)
-    edge_index = edge_index.t()
-    for i in tqdm(range(edge_index.size(1))):
-        s = edge_index[0][i].item()
-        t = edge_index[1][i].item()
-        if s == t:
-            count += 1
-            scores.append(999)
-            continue
-
-        if nx.has_path(G, source=s, target=t):
-            sp = nx.shortest_path_length(G, source=s, target=t)
-        else:
-            sp = 999
-        # scores.append(1/(sp))
-        scores.append(np.exp(-(sp-1)))
+    A = ssp.csr_matrix(A)
+    sp = shortest_path_distance(A + A.T, edge_index.t(), remove=remove)
+    sp[np.isinf(sp)] = 999
+    scores = np.exp(-(sp - 1))
+    # kept from the networkx version, a self pair scores 999
+    scores[sp == 0] = 999
     print(f'evaluated shortest path for {scores[:20]} edges')
     return torch.FloatTensor(scores)
 
 
-def shortest_path_citation2(G, edge_index, remove=False):
-    scores = []
-    count = 0
-    print('remove: ', remove)
-    
-    for i in tqdm(range(edge_index['source_node'].size(0))):
-        
-        s = edge_index['source_node'][i].item()
-        t = edge_index['target_node'][i].item()
-        if s == t:
-            count += 1
-            scores.append(999)
-            continue
-
-        if nx.has_path(G, source=s, target=t):
-            sp = nx.shortest_path_length(G, source=s, target=t)
-        else:
-            sp = 999
-        # scores.append(1/(sp))
-        scores.append(np.exp(-(sp-1)))
-    print(f'evaluated shortest path for {scores[:20]} edges')
-    return torch.FloatTensor(scores)
+def shortest_path_citation2(A, edge_index, remove=False):
+    """
+    shortest_path for the ogbl-citation2 style dict with 'source_node' and 'target_node'
+    """
+    edge_index = torch.stack([edge_index['source_node'], edge_index['target_node']], dim=1)
+    return shortest_path(A, edge_index, remove)
 
 
-def plot_CN_dist(A, split_edge, dataset):
+def plot_CN_dist(A, split_edge, dataset, val_pct: float = 0.05, test_pct: float = 0.1, seed: int = 0):
     use_heuristic = 'CN'
-    pos_train_pred, _ = CN(A, split_edge['train']['edge'])
+    store = HeuristicScoreStore(dataset, seed=seed, val_pct=val_pct, test_pct=test_pct)
+    pos_train_pred = store.score(use_heuristic, CN, A, split_edge['train']['edge'], 'train_pos')
 
     neg_edge_index = negative_sampling(
     data.edge_index, num_nodes=num_nodes,
     num_neg_samples=pos_train_pred.size(0))
-    neg_train_pred, _ = CN(A, neg_edge_index)
+    neg_train_pred = store.score(use_heuristic, CN, A, neg_edge_index, 'train_neg')
 
-    pos_valid_pred, _ = CN(A, split_edge['valid']['edge'])
-    neg_valid_pred, _ = CN(A, split_edge['valid']['edge_neg'])
+    pos_valid_pred = store.score(use_heuristic, CN, A, split_edge['valid']['edge'], 'valid_pos')
+    neg_valid_pred = store.score(use_heuristic, CN, A, split_edge['valid']['edge_neg'], 'valid_neg')
    
-    pos_test_pred, _ = CN(A, split_edge['test']['edge'])
-    neg_test_pred, _ = CN(A, split_edge['test']['edge_neg'])
+    pos_test_pred = store.score(use_heuristic, CN, A, split_edge['test']['edge'], 'test_pos')
+    neg_test_pred = store.score(use_heuristic, CN, A, split_edge['test']['edge_neg'], 'test_neg')
 
     bin_edges = [0, 1, 3, 10, 25, float('inf')]
     colors = sns.color_palette("husl", 3)  # 'husl' is one of many color palettes available
@@ -335,21 +318,21 @@ def plot_CN_citation2_dist(A, split_edge, dataset):
 
 
 
-def plot_shortest_path_dist(A, split_edge, dataset):
+def plot_shortest_path_dist(A, split_edge, dataset, val_pct: float = 0.05, test_pct: float = 0.1, seed: int = 0):
     use_heuristic = 'shortest_path'
-    G = nx.from_scipy_sparse_array(A)
-    pos_train_pred = shortest_path(G, split_edge['train']['edge'])
+    store = HeuristicScoreStore(dataset, seed=seed, val_pct=val_pct, test_pct=test_pct)
+    pos_train_pred = store.score(use_heuristic, shortest_path, A, split_edge['train']['edge'], 'train_pos')
 
     neg_edge_index = negative_sampling(
     data.edge_index, num_nodes=num_nodes,
     num_neg_samples=pos_train_pred.size(0))
-    neg_train_pred = shortest_path(G, neg_edge_index.t())
+    neg_train_pred = store.score(use_heuristic, shortest_path, A, neg_edge_index.t(), 'train_neg')
 
-    pos_valid_pred = shortest_path(G, split_edge['valid']['edge'])
-    neg_valid_pred = shortest_path(G, split_edge['valid']['edge_neg'])
+    pos_valid_pred = store.score(use_heuristic, shortest_path, A, split_edge['valid']['edge'], 'valid_pos')
+    neg_valid_pred = store.score(use_heuristic, shortest_path, A, split_edge['valid']['edge_neg'], 'valid_neg')
    
-    pos_test_pred = shortest_path(G, split_edge['test']['edge'])
-    neg_test_pred = shortest_path(G, split_edge['test']['edge_neg'])
+    pos_test_pred = store.score(use_heuristic, shortest_path, A, split_edge['test']['edge'], 'test_pos')
+    neg_test_pred = store.score(use_heuristic, shortest_path, A, split_edge['test']['edge_neg'], 'test_neg')
 
     bin_edges = [0, 1, 3, 10, 25, float('inf')]
     colors = sns.color_palette("husl", 3)  # 'husl' is one of many color palettes available
@@ -404,12 +387,11 @@ def plot_shortest_path_dist(A, split_edge, dataset):
 def plot_spath_citation2_dist(A, split_edge, dataset):
     use_heuristic = 'shortest_path'
     len = 100
-    G = nx.from_scipy_sparse_array(A)
 
     # create edge_index from source and target node
     pos_edge_index  = torch.stack([split_edge['train']['source_node'], split_edge['train']['target_node']])
     edge_index  = {'source_node': split_edge['train']['source_node'], 'target_node': split_edge['train']['target_node']}
-    pos_train_pred  =  shortest_path_citation2(G, edge_index)
+    pos_train_pred  =  shortest_path_citation2(A, edge_index)
     neg_edge_index = negative_sampling(
     pos_edge_index, num_nodes=num_nodes,
     num_neg_samples=100)
@@ -419,23 +401,23 @@ def plot_spath_citation2_dist(A, split_edge, dataset):
         'target_node': neg_edge_index[1],
     }
 
-    neg_train_pred = shortest_path_citation2(G, neg_train_index)
+    neg_train_pred = shortest_path_citation2(A, neg_train_index)
     
-    pos_valid_pred = shortest_path_citation2(G, split_edge['valid'])
+    pos_valid_pred = shortest_path_citation2(A, split_edge['valid'])
     # 1000 copies last 300 hours, please optimize 
     source = split_edge['valid']['source_node'].view(-1, 1).repeat(1, 1000).view(-1)
     target_neg = split_edge['valid']['target_node_neg'].view(-1)
 
     valid_neg_edge = {'source_node': source[:86596], 'target_node': target_neg[:86596]}
-    neg_valid_pred = shortest_path_citation2(G, valid_neg_edge)
+    neg_valid_pred = shortest_path_citation2(A, valid_neg_edge)
 
-    pos_test_pred = shortest_path_citation2(G, split_edge['test'])
+    pos_test_pred = shortest_path_citation2(A, split_edge['test'])
     
-    source = split_edge['test']['source_node'].view(-1, 1).repeat(1, 1000).view(-1)
-    target_neg = split_edge['test']['target_node_neg'].view(-1)
-
-    test_neg_edge = {'source_node': source, 'target_node': target_neg}
-    neg_test_pred = shortest_path_citation2(G, test_neg_edge)
+    # the negatives share the source of their query, every distinct pair is searched once
+    test_pos_edge = torch.stack([split_edge['test']['source_node'], split_edge['test']['target_node']])
+    test_scores = score_queries(lambda edge: shortest_path(A, edge.t()), test_pos_edge,
+                                split_edge['test']['target_node_neg'])
+    neg_test_pred = test_scores[:, 1:].reshape(-1)
     
     bin_edges = [0, 1, 3, 10, 25, float('inf')]
     colors = sns.color_palette("husl", 3)  # 'husl' is one of many color palettes available
@@ -512,6 +494,9 @@ if __name__ == '__main__':
                                                             'ogbl-vessel'],
                                     #default='ogbl-ppa',
         help='List of datasets')
+    parser.add_argument('--val_pct', type=float, default=0.05, help='share of the edges in the valid split')
+    parser.add_argument('--test_pct', type=float, default=0.1, help='share of the edges in the test split')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the split and the train negatives')
 
     args = parser.parse_args()
 
@@ -527,8 +512,10 @@ if __name__ == '__main__':
 
     for dataset, color in zip(data_list, color_list):
         print(dataset)
+        # the stored heuristic scores are only found again for the same split and negatives
+        seed_everything(args.seed)
         try:
-            data, splits = load_graph(dataset)
+            data, splits = load_graph(dataset, args.val_pct, args.test_pct)
         except ValueError as e:
             print(e)
             continue
@@ -550,12 +537,12 @@ if __name__ == '__main__':
 
         elif plot_CN_dist_link:
             if dataset != 'ogbl-citation2':
-                plot_CN_dist(A, splits, dataset)
+                plot_CN_dist(A, splits, dataset, args.val_pct, args.test_pct, args.seed)
             else:
                 plot_CN_citation2_dist(A, splits, dataset)
         elif plot_shortest_path_link:
             if dataset != 'ogbl-citation2':
-                plot_shortest_path_dist(A, splits, dataset)
+                plot_shortest_path_dist(A, splits, dataset, args.val_pct, args.test_pct, args.seed)
             else:
                 plot_spath_citation2_dist(A, splits, dataset)
             
@@ -802,7 +802,9 @@ def create_scheduler(optimizer, scheduler_config):
 
 
 def use_pretrained_llm_embeddings(model_type: str, model_name: str, data: List[str], batch_size: int=4):
-    
+    # the tokenizers and encoders take a list of str, not the lazy TextStore of data_utils/text_store.py
+    if data is not None and not isinstance(data, list):
+        data = list(data)
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
     if model_type == "sentence_embedding":
         embeddings = sentence_transformer_embedding_generation(model_name, data)
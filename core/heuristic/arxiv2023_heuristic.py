@@ -4,10 +4,12 @@ import pandas as pd
 import torch
 import torch_geometric.transforms as T
 from torch_geometric.transforms import RandomLinkSplit
+from torch_geometric import seed_everything
 import os, sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from data_utils.dataset import CustomPygDataset, CustomLinkDataset
 from heuristic.lsf import CN, AA, RA, InverseRA
+from heuristic.score_store import HeuristicScoreStore
 from heuristic.gsf import Ben_PPR, shortest_path, katz_apro, katz_close , SymPPR
 from data_utils.load_data_lp import get_raw_text_pubmed, get_pubmed_lp
 import matplotlib.pyplot as plt
@@ -101,11 +103,12 @@ def eval_arxiv_23_acc() -> Dict:
     
     return result_acc
 
-def eval_cora_mrr() -> None:
+def eval_cora_mrr(seed: int = 0) -> None:
     """load text attribute graph in link predicton setting
 
     """
 
+    seed_everything(seed)
     dataset, text, splits = get_raw_text_arxiv_2023(undirected = True,
                                                 include_negatives = True,
                                                 val_pct = 0.15,
@@ -131,29 +134,30 @@ def eval_cora_mrr() -> None:
     neg_m = construct_sparse_adj(neg_test_index)
     plot_coo_matrix(neg_m, f'test_neg_index.png')
     
+    store = HeuristicScoreStore('arxiv_2023', seed=seed, val_pct=0.15, test_pct=0.05)
     evaluator_hit = Evaluator(name='ogbl-collab')
     evaluator_mrr = Evaluator(name='ogbl-citation2')
     
     result_dict = {}
     # , 'InverseRA'
     for use_heuristic in ['CN', 'AA', 'RA']:
-        pos_test_pred, _ = eval(use_heuristic)(full_A, pos_test_index)
-        neg_test_pred, _ = eval(use_heuristic)(full_A, neg_test_index)
+        pos_test_pred = store.score(use_heuristic, eval(use_heuristic), full_A, pos_test_index, 'pos')
+        neg_test_pred = store.score(use_heuristic, eval(use_heuristic), full_A, neg_test_index, 'neg')
         
         result = get_metric_score(evaluator_hit, evaluator_mrr, pos_test_pred, neg_test_pred)
         result_dict.update({f'{use_heuristic}': result})
         
     # , 'SymPPR'
     for use_heuristic in ['Ben_PPR']:
-        pos_test_pred, _ = eval(use_heuristic)(full_A, pos_test_index)
-        neg_test_pred, _ = eval(use_heuristic)(full_A, neg_test_index)
+        pos_test_pred = store.score(use_heuristic, eval(use_heuristic), full_A, pos_test_index, 'pos')
+        neg_test_pred = store.score(use_heuristic, eval(use_heuristic), full_A, neg_test_index, 'neg')
         result = get_metric_score(evaluator_hit, evaluator_mrr, pos_test_pred, neg_test_pred)
         result_dict.update({f'{use_heuristic}': result})
     
     #  'katz_close'
     for use_heuristic in ['shortest_path', 'katz_apro']:
-        pos_test_pred = eval(use_heuristic)(full_A, pos_test_index)
-        neg_test_pred = eval(use_heuristic)(full_A, neg_test_index)
+        pos_test_pred = store.score(use_heuristic, eval(use_heuristic), full_A, pos_test_index, 'pos')
+        neg_test_pred = store.score(use_heuristic, eval(use_heuristic), full_A, neg_test_index, 'neg')
         result = get_metric_score(evaluator_hit, evaluator_mrr, pos_test_pred, neg_test_pred)
 
         # calc mrr and hits@k
@@ -0,0 +1,193 @@
+"""
+Run a list of heuristics on a list of datasets in one go.
+Every message passing graph is built once and shared with a process pool through shared memory,
+the heuristic x split jobs are spread over the pool and one table with the scores, the time and
+the peak memory of every job (traced allocations) is written at the end, together with the lifetime peak RSS
+of the worker that ran it.
+"""
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse
+import time
+import resource
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+import pandas as pd
+import scipy.sparse as ssp
+import torch
+
+from heuristic.lsf import local_heuristics, LOCAL_HEURISTICS
+from heuristic.gsf import batched_PPR, katz_sparse, katz_apro, shortest_path
+from heuristic.score_store import HeuristicScoreStore
+
+
+def _local(name: str, A, edge_index):
+    # one thread per job, the pool already runs one job per core
+    return local_heuristics(A, edge_index, (name,), num_workers=1)[name]
+
+
+HEURISTICS: Dict[str, Callable] = {name: partial(_local, name) for name in LOCAL_HEURISTICS}
+HEURISTICS.update({
+    'PPR': batched_PPR,
+    'SymPPR': partial(batched_PPR, symmetric=True),
+    'katz': katz_sparse,
+    'katz_apro': katz_apro,
+    'shortest_path': shortest_path,
+})
+
+# message passing graphs of the current pool, filled by _init_worker
+_GRAPHS = {}
+
+
+def share_csr(A: ssp.csr_matrix) -> Tuple[Dict, List[shared_memory.SharedMemory]]:
+    """copy the arrays of A into shared memory, returns a picklable description and the blocks to release"""
+    meta, blocks = {'shape': A.shape}, []
+    for key in ('indptr', 'indices', 'data'):
+        arr = getattr(A, key)
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+        meta[key] = (shm.name, arr.shape, arr.dtype.str)
+        blocks.append(shm)
+    return meta, blocks
+
+
+def attach_csr(meta: Dict) -> Tuple[ssp.csr_matrix, List[shared_memory.SharedMemory]]:
+    """csr matrix on top of the shared arrays of share_csr, no copy is made"""
+    arrays, blocks = {}, []
+    for key in ('indptr', 'indices', 'data'):
+        name, shape, dtype = meta[key]
+        shm = shared_memory.SharedMemory(name=name)
+        arrays[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        blocks.append(shm)
+    A = ssp.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=meta['shape'], copy=False)
+    return A, blocks
+
+
+def _init_worker(graphs: Dict[str, Dict]) -> None:
+    for split, meta in graphs.items():
+        _GRAPHS[split] = attach_csr(meta)
+
+
+def _run_job(dataset: str, split: str, heuristic: str, pos_edge: np.ndarray, neg_edge: np.ndarray,
+             store_args: Dict) -> Dict:
+    A, _ = _GRAPHS[split]
+    func = HEURISTICS[heuristic]
+    store = HeuristicScoreStore(**store_args) if store_args is not None else None
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    preds = {}
+    for column, edge in (('pos', pos_edge), ('neg', neg_edge)):
+        edge = torch.from_numpy(edge)
+        if store is not None:
+            preds[column] = store.score(heuristic, func, A, edge, f'{split}_{column}')
+        else:
+            scores = func(A, edge)
+            preds[column] = torch.as_tensor(scores[0] if isinstance(scores, tuple) else scores, dtype=torch.float32)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # peak_mem_mb is the peak of this job, ru_maxrss is the peak of the pooled worker over every job it ran so far
+    return {'dataset': dataset, 'split': split, 'heuristic': heuristic,
+            'pos': preds['pos'].numpy(), 'neg': preds['neg'].numpy(),
+            'time_s': round(elapsed, 4), 'peak_mem_mb': round(peak / 2 ** 20, 2),
+            'worker_peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10, 2)}
+
+
+def load_lp_splits(name: str, seed: int, val_pct: float, test_pct: float, method: str = 'w2v') -> Dict:
+    """split a dataset of data_utils.load.load_data_lp the way the heuristic drivers do"""
+    from yacs.config import CfgNode as CN
+    from data_utils.load import load_data_lp
+    from torch_geometric import seed_everything
+    # python's random as well, RandomLinkSplit draws its negatives with random.sample
+    seed_everything(seed)
+    cfg = CN({'name': name, 'device': 'cpu', 'method': method, 'seed': seed,
+              'split_index': [1 - val_pct - test_pct, val_pct, test_pct],
+              'include_negatives': True, 'split_labels': True})
+    splits, _, _ = load_data_lp[name](cfg)
+    return splits
+
+
+def message_passing_csr(data) -> ssp.csr_matrix:
+    edge_index = data.edge_index.cpu()
+    num_nodes = data.num_nodes
+    edge_weight = np.ones(edge_index.size(1))
+    return ssp.csr_matrix((edge_weight, (edge_index[0].numpy(), edge_index[1].numpy())), shape=(num_nodes, num_nodes))
+
+
+def run_benchmark(datasets: List[str], heuristics: List[str], splits: Tuple[str, ...] = ('valid', 'test'),
+                  seed: int = 0, val_pct: float = 0.15, test_pct: float = 0.05, num_workers: int = None,
+                  use_store: bool = True, load_splits: Callable = load_lp_splits) -> pd.DataFrame:
+    """
+    :param datasets: names of data_utils.load.load_data_lp
+    :param heuristics: names of HEURISTICS
+    :param splits: splits to score, each one on its own message passing graph
+    :param use_store: read and write scores through HeuristicScoreStore
+    :param load_splits: load_splits(name, seed, val_pct, test_pct) -> {'train': Data, 'valid': Data, 'test': Data}
+    :return: DataFrame with one row per dataset, split and heuristic
+    """
+    from ogb.linkproppred import Evaluator
+    from heuristic.eval import get_metric_score
+    unknown = set(heuristics) - set(HEURISTICS)
+    if unknown:
+        raise ValueError(f'unknown heuristics {sorted(unknown)}, choose from {sorted(HEURISTICS)}')
+    evaluator_hit = Evaluator(name='ogbl-collab')
+    evaluator_mrr = Evaluator(name='ogbl-citation2')
+
+    rows = []
+    for dataset in datasets:
+        data_splits = load_splits(dataset, seed, val_pct, test_pct)
+        graphs, blocks = {}, []
+        for split in splits:
+            graphs[split], shm = share_csr(message_passing_csr(data_splits[split]))
+            blocks += shm
+        store_args = dict(dataset=dataset, seed=seed, val_pct=val_pct, test_pct=test_pct) if use_store else None
+        try:
+            with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker, initargs=(graphs,)) as pool:
+                jobs = [pool.submit(_run_job, dataset, split, heuristic,
+                                    data_splits[split].pos_edge_label_index.cpu().numpy(),
+                                    data_splits[split].neg_edge_label_index.cpu().numpy(),
+                                    store_args)
+                        for split in splits for heuristic in heuristics]
+                for job in as_completed(jobs):
+                    res = job.result()
+                    pos, neg = torch.from_numpy(res.pop('pos')), torch.from_numpy(res.pop('neg'))
+                    res.update(get_metric_score(evaluator_hit, evaluator_mrr, pos, neg))
+                    print(res)
+                    rows.append(res)
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+    return pd.DataFrame(rows).sort_values(['dataset', 'split', 'heuristic'], ignore_index=True)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='heuristic benchmark')
+    parser.add_argument('--data', nargs='+', default=['cora'])
+    parser.add_argument('--heuristics', nargs='+', default=['CN', 'AA', 'RA', 'PPR', 'katz', 'shortest_path'])
+    parser.add_argument('--splits', nargs='+', default=['valid', 'test'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--val_pct', type=float, default=0.15)
+    parser.add_argument('--test_pct', type=float, default=0.05)
+    parser.add_argument('--num_workers', type=int, default=None)
+    parser.add_argument('--no_store', action='store_true', help='always recompute the scores')
+    parser.add_argument('--out', type=str, default=None)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    results = run_benchmark(args.data, args.heuristics, tuple(args.splits), args.seed,
+                            args.val_pct, args.test_pct, args.num_workers, not args.no_store)
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'results', 'heuristic'))
+    out = args.out or os.path.join(root, f'benchmark_seed{args.seed}.csv')
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    results.to_csv(out, index=False)
+    print(results.to_string())
+    print(f'saved to {out}')
@@ -0,0 +1,135 @@
+"""
+Top-k two-hop candidates of every node under CN, AA, RA or InverseRA, e.g. as HeaRT style hard negatives.
+Two-hop neighbourhoods are enumerated from the CSR neighbour lists a block of rows at a time, so A @ A is never
+materialized and the memory is bounded by max_paths per worker plus the k candidates kept per node.
+"""
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
+import numpy as np
+import torch
+from torch import FloatTensor
+from scipy.sparse import csr_matrix
+from tqdm import tqdm
+
+from heuristic.lsf import _canonical_csr, _node_weights
+
+CANDIDATE_HEURISTICS = ('CN', 'AA', 'RA', 'InverseRA')
+
+
+def _ranges(starts: np.ndarray, lens: np.ndarray) -> np.ndarray:
+    """concatenation of arange(s, s + l) for every start s and length l"""
+    offsets = np.cumsum(lens) - lens
+    return np.arange(int(lens.sum()), dtype=np.int64) - np.repeat(offsets - starts, lens)
+
+
+def _topk_block(A: csr_matrix, A_t: csr_matrix, keys: np.ndarray, weight: np.ndarray,
+                rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Enumerate all paths u -> w <- v of the rows u of one block, sum their weights per (u, v)
+    and keep the k best candidates v of every u that are neither u itself nor a neighbour of u.
+    """
+    num_nodes = A.shape[0]
+    # first hop u -> w on the rows of A
+    starts = A.indptr[rows].astype(np.int64)
+    lens = A.indptr[rows + 1] - starts
+    owner = np.repeat(np.arange(rows.shape[0]), lens)
+    pos = _ranges(starts, lens)
+    mid = A.indices[pos]
+    val = A.data[pos] if weight is None else A.data[pos] * weight[mid]
+
+    # second hop w <- v on the rows of A^T, as in CN = A[u].multiply(A[v]).sum()
+    starts = A_t.indptr[mid].astype(np.int64)
+    lens = A_t.indptr[mid + 1] - starts
+    owner = np.repeat(owner, lens)
+    pos = _ranges(starts, lens)
+    cand = A_t.indices[pos].astype(np.int64)
+    val = np.repeat(val, lens) * A_t.data[pos]
+
+    node = rows[owner].astype(np.int64)
+    query = node * num_nodes + cand
+    loc = np.searchsorted(keys, query)
+    loc[loc == keys.shape[0]] = 0
+    keep = (cand != node) & (keys[loc] != query)
+
+    pair_key, inverse = np.unique(owner[keep] * num_nodes + cand[keep], return_inverse=True)
+    score = np.bincount(inverse.reshape(-1), weights=val[keep], minlength=pair_key.shape[0])
+    nonzero = score > 0
+    owner, cand, score = pair_key[nonzero] // num_nodes, pair_key[nonzero] % num_nodes, score[nonzero]
+
+    # best scores first within every owner, ties broken by the smaller candidate id
+    order = np.lexsort((cand, -score, owner))
+    owner, cand, score = owner[order], cand[order], score[order]
+    group_start = np.searchsorted(owner, owner)
+    top = np.arange(owner.shape[0]) - group_start < k
+    return rows[owner[top]].astype(np.int64), cand[top], score[top]
+
+
+def _block_bounds(paths: np.ndarray, max_paths: int) -> np.ndarray:
+    """
+    greedy block boundaries over rows with the given path counts, a block grows while it stays within
+    max_paths, a row heavier than max_paths forms its own block
+    :return: int64 array [0, ..., len(paths)] of the block starts and the end
+    """
+    cum = np.concatenate([[0], np.cumsum(paths, dtype=np.int64)])
+    bounds, start = [0], 0
+    # one binary search per block instead of a python step per row
+    while start < paths.shape[0]:
+        end = int(np.searchsorted(cum, cum[start] + max_paths, side='right')) - 1
+        start = max(end, start + 1)
+        bounds.append(start)
+    return np.asarray(bounds, dtype=np.int64)
+
+
+def topk_candidates(A: csr_matrix, k: int = 100, heuristic: str = 'CN', nodes: torch.Tensor = None,
+                    max_paths: int = 2 ** 24, num_workers: int = None,
+                    out_path: str = None) -> Tuple[FloatTensor, torch.Tensor]:
+    """
+    For every node its k non-neighbours with the highest heuristic score, candidates with a score of 0
+    (more than two hops away) are never returned.
+    Rows are grouped into blocks of at most max_paths two-hop paths (a single heavier row forms its own block)
+    and the blocks are processed in a thread pool, numpy releases the GIL in the sort and bincount kernels.
+    :param A: scipy sparse adjacency matrix
+    :param k: number of candidates per node
+    :param heuristic: name out of CANDIDATE_HEURISTICS, scores equal those of the functions in lsf.py
+    :param nodes: the nodes to generate candidates for, defaults to all nodes
+    :param max_paths: int, two-hop paths enumerated per block, bounds the memory of one worker
+    :param num_workers: int, number of threads, defaults to os.cpu_count()
+    :param out_path: optional .npz file to save the (node, candidate, score) table to
+    :return: Tuple containing a FloatTensor of scores and the pyg edge_index (node, candidate) of shape [2, M],
+             sorted by node and by decreasing score
+    """
+    if heuristic not in CANDIDATE_HEURISTICS:
+        raise ValueError(f'unknown heuristic {heuristic}, choose from {CANDIDATE_HEURISTICS}')
+    A = _canonical_csr(A)
+    num_nodes = A.shape[0]
+    A_t = _canonical_csr(A.T.tocsr())
+    keys = np.repeat(np.arange(num_nodes, dtype=np.int64), np.diff(A.indptr)) * num_nodes + A.indices
+    weight = None if heuristic == 'CN' else _node_weights(A)[heuristic]
+
+    if nodes is None:
+        rows = np.arange(num_nodes, dtype=np.int64)
+    else:
+        rows = np.unique(torch.as_tensor(nodes).cpu().numpy().astype(np.int64))
+    # number of two-hop paths of every row, without touching the paths themselves
+    path_cum = np.concatenate([[0], np.cumsum(np.diff(A_t.indptr)[A.indices], dtype=np.int64)])
+    paths = path_cum[A.indptr[rows + 1]] - path_cum[A.indptr[rows]]
+    blocks = np.split(rows, _block_bounds(paths, max_paths)[1:-1])
+
+    def generate(block):
+        return _topk_block(A, A_t, keys, weight, block, k)
+
+    num_workers = num_workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        chunks = list(tqdm(pool.map(generate, blocks), total=len(blocks)))
+
+    if chunks:
+        node, cand, score = (np.concatenate(cur, 0) for cur in zip(*chunks))
+    else:
+        node, cand, score = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    print(f'generated {node.shape[0]} {heuristic} candidates for {rows.shape[0]} nodes')
+    if out_path is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+        np.savez(out_path, node=node, candidate=cand, score=score.astype(np.float32))
+    return torch.FloatTensor(score), torch.from_numpy(np.stack([node, cand], 0))
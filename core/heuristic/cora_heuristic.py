@@ -10,7 +10,9 @@ import torch_geometric.transforms as T
 from torch_geometric.datasets import Planetoid
 from torch_geometric.data import Data, InMemoryDataset
 from torch_geometric.transforms import RandomLinkSplit
+from torch_geometric import seed_everything
 from heuristic.lsf import CN, AA, RA, InverseRA
+from heuristic.score_store import HeuristicScoreStore
 from heuristic.gsf import Ben_PPR, shortest_path, katz_apro, katz_close, SymPPR
 # from core.slimg.mlp_dot_product import pairwise_prediction
 import matplotlib.pyplot as plt
@@ -22,10 +24,12 @@ from heuristic.eval import get_metric_score
 FILE_PATH = f'{get_git_repo_root_path()}/'
 
 
-def eval_cora_mrr() -> None:
+def eval_cora_mrr(seed: int = 0) -> None:
     """load text attribute graph in link predicton setting
     """
 
+    # the score store only hits for the same split, seed the link split and its negatives
+    seed_everything(seed)
     dataset, data_cited, splits = get_cora_casestudy(undirected = True,
                                                 include_negatives = True,
                                                 val_pct = 0.15,
@@ -51,13 +55,14 @@ def eval_cora_mrr() -> None:
     neg_m = construct_sparse_adj(neg_test_index)
     plot_coo_matrix(neg_m, f'test_neg_index.png')
 
+    store = HeuristicScoreStore('cora', seed=seed, val_pct=0.15, test_pct=0.05)
     evaluator_hit = Evaluator(name='ogbl-collab')
     evaluator_mrr = Evaluator(name='ogbl-citation2')
 
     result_dict = {}
     for use_heuristic in ['CN', 'AA', 'RA', 'InverseRA']:
-        pos_test_pred, _ = eval(use_heuristic)(full_A, pos_test_index)
-        neg_test_pred, _ = eval(use_heuristic)(full_A, neg_test_index)
+        pos_test_pred = store.score(use_heuristic, eval(use_heuristic), full_A, pos_test_index, 'pos')
+        neg_test_pred = store.score(use_heuristic, eval(use_heuristic), full_A, neg_test_index, 'neg')
 
     #     result = get_metric_score(evaluator_hit, evaluator_mrr, pos_test_pred, neg_test_pred)
     #     result_dict.update({f'{use_heuristic}': result})
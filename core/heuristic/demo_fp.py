@@ -25,6 +25,7 @@ from torch_geometric.utils import to_networkx, to_undirected
 from ogb.linkproppred import PygLinkPropPredDataset, Evaluator
 from core.graphgps.utility.utils import get_root_dir
 from eval import evaluate_hits, evaluate_mrr, evaluate_auc
+from score_store import HeuristicScoreStore
 import pandas as pd 
 from math import inf
 import seaborn as sns
@@ -173,8 +174,10 @@ def get_hist(A, full_A, use_heuristic, data, num_nodes):
 
 def get_test_hist(A, test_pos, test_neg, use_heuristic, data, num_nodes):
     
-    pos_test_pred = eval(use_heuristic)(A, test_pos)
-    neg_test_pred = eval(use_heuristic)(A, test_neg)
+    # HeaRT splits are fixed files, their edge fingerprint keeps the stored scores aligned
+    store = HeuristicScoreStore(data, seed='heart', val_pct=None, test_pct=None)
+    pos_test_pred = store.score(use_heuristic, eval(use_heuristic), A, test_pos, 'pos')
+    neg_test_pred = store.score(use_heuristic, eval(use_heuristic), A, test_neg, 'neg')
     
     bin_edges = [0, 1, 3, 10, 25, float('inf')]
     
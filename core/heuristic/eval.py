@@ -1,4 +1,5 @@
 import torch
+from typing import Dict, Sequence
 
 from sklearn.metrics import roc_auc_score
 from sklearn.metrics import average_precision_score
@@ -61,6 +62,20 @@ def evaluate_mrr(evaluator, pos_val_pred, neg_val_pred):
     return results
 
 
+def evaluate_mrr_shared(pos_val_pred, neg_val_pred):
+    '''
+        same metrics as evaluate_mrr for negatives shared by all positives,
+        neg_val_pred holds every negative once instead of one row per positive
+    '''
+    mrr_output = eval_mrr_shared(pos_val_pred, neg_val_pred)
+
+    results = {}
+    for K in [1, 3, 10]:
+        results[f'mrr_hit{K}'] = round(mrr_output[f'hits@{K}_list'].mean().item(), 4)
+    results['MRR'] = round(mrr_output['mrr_list'].mean().item(), 4)
+    for K in [20, 50, 100]:
+        results[f'mrr_hit{K}'] = round(mrr_output[f'hits@{K}_list'].mean().item(), 4)
+    return results
 
 
 def evaluate_auc(val_pred, val_true):
@@ -120,6 +135,31 @@ def eval_mrr(y_pred_pos, y_pred_neg):
                 'mrr_list': mrr_list}
 
 
+def eval_mrr_shared(y_pred_pos, y_pred_neg, k_list=(1, 3, 10, 20, 50, 100)):
+    '''
+        compute mrr against one set of negatives shared by all positives
+        y_pred_neg is an array with shape (num_entities_neg, ).
+        y_pred_pos is an array with shape (batch size, )
+        gives the same ranks as eval_mrr(y_pred_pos, y_pred_neg.repeat(batch size, 1)),
+        the negatives are sorted once and every positive is located with a binary search,
+        O((P + N) log N) time and O(P + N) memory instead of a P x N comparison
+    '''
+    dtype = torch.promote_types(y_pred_pos.dtype, y_pred_neg.dtype)
+    y_pred_pos = y_pred_pos.reshape(-1).to(dtype)
+    y_pred_neg, _ = torch.sort(y_pred_neg.reshape(-1).to(dtype=dtype, device=y_pred_pos.device))
+    num_neg = y_pred_neg.size(0)
+
+    # optimistic rank: number of negatives with at least the positive score
+    optimistic_rank = num_neg - torch.searchsorted(y_pred_neg, y_pred_pos, right=False)
+    # pessimistic rank: number of negatives with a larger score than the positive
+    pessimistic_rank = num_neg - torch.searchsorted(y_pred_neg, y_pred_pos, right=True)
+    ranking_list = 0.5 * (optimistic_rank + pessimistic_rank) + 1
+
+    results = {f'hits@{K}_list': (ranking_list <= K).to(torch.float) for K in k_list}
+    results['mrr_list'] = 1./ranking_list.to(torch.float)
+    return results
+
+
 
 
 def eval_hard_negs(pos_pred, neg_pred, k_list):
@@ -176,7 +216,184 @@ def get_prediction(full_A, use_heuristic, pos_test_edge, neg_test_edge):
 
 #     return result
 
+def fused_metric_score(pos_pred, neg_pred, k_list: Sequence[int] = (1, 3, 10, 20, 50, 100)) -> Dict[str, float]:
+    '''
+        Hits@K for all K, MRR, mrr_hit@K, AUC, AP and ACC from one sort of the concatenated scores,
+        negatives are shared by all positives as in get_metric_score.
+        Hits@K follows the ogbl-collab evaluator, AUC and AP match sklearn (ties included),
+        ACC thresholds at the middle of the score range like the trainers did.
+        Everything stays on the device of the scores until the single transfer of the final report.
+    '''
+    pos_pred, neg_pred = pos_pred.reshape(-1), neg_pred.reshape(-1).to(pos_pred.device)
+    dtype = torch.promote_types(pos_pred.dtype, neg_pred.dtype)
+    pos_pred, neg_pred = pos_pred.to(dtype), neg_pred.to(dtype)
+    num_pos, num_neg = pos_pred.size(0), neg_pred.size(0)
+
+    y_pred = torch.cat([pos_pred, neg_pred])
+    y_true = torch.cat([torch.ones(num_pos, device=y_pred.device), torch.zeros(num_neg, device=y_pred.device)])
+    y_pred, order = torch.sort(y_pred, descending=True, stable=True)
+    y_true = y_true[order]
+    neg_sorted = y_pred[y_true == 0].flip(0)
+
+    # ranks of the positives among the negatives, see eval_mrr_shared
+    optimistic_rank = num_neg - torch.searchsorted(neg_sorted, pos_pred, right=False)
+    pessimistic_rank = num_neg - torch.searchsorted(neg_sorted, pos_pred, right=True)
+    ranking_list = 0.5 * (optimistic_rank + pessimistic_rank).double() + 1
+
+    metrics = {}
+    for K in k_list:
+        # ogbl-collab: positives above the K-th best negative, 1 if there are fewer than K negatives
+        if num_neg < K:
+            metrics[f'Hits@{K}'] = torch.ones((), dtype=torch.float64, device=y_pred.device)
+        else:
+            metrics[f'Hits@{K}'] = (pos_pred > neg_sorted[num_neg - K]).double().mean()
+    metrics['MRR'] = (1. / ranking_list).mean()
+    for K in k_list:
+        metrics[f'mrr_hit{K}'] = (ranking_list <= K).double().mean()
+
+    # Mann-Whitney U, a tie between a positive and a negative counts one half
+    metrics['AUC'] = (num_neg + 1 - ranking_list).mean() / num_neg
+
+    # average precision over the distinct thresholds, the last position of every run of equal scores
+    last = torch.ones_like(y_true, dtype=torch.bool)
+    last[:-1] = y_pred[1:] != y_pred[:-1]
+    tp = torch.cumsum(y_true.double(), 0)[last]
+    precision = tp / (torch.nonzero(last).view(-1) + 1)
+    recall_gain = torch.diff(tp, prepend=tp.new_zeros(1)) / num_pos
+    metrics['AP'] = (recall_gain * precision).sum()
+
+    hard_thres = (y_pred[0] + y_pred[-1]) / 2
+    metrics['ACC'] = ((pos_pred >= hard_thres).sum() + (neg_pred < hard_thres).sum()).double() / (num_pos + num_neg)
+
+    values = torch.stack(list(metrics.values())).tolist()
+    return {key: round(value, 5 if key == 'ACC' else 4) for key, value in zip(metrics, values)}
+
+
+class StreamingMetricScore(object):
+    '''
+        Bounded-memory version of fused_metric_score, fed batch by batch.
+        All positives have to be added before the first negative, as the trainers predict them.
+        The positives are kept (one score each), the negatives only through
+        - how many of them fall above / at each sorted positive, which gives the exact ranks, MRR, AUC and AP
+        - the max(k_list) largest ones, which give the exact Hits@K
+        - a histogram of num_bins bins, which gives a binned accuracy reported as ACC_binned
+        so the memory does not grow with the number of negatives.
+    '''
+
+    def __init__(self, k_list: Sequence[int] = (1, 3, 10, 20, 50, 100), num_bins: int = 2 ** 16):
+        self.k_list = tuple(k_list)
+        self.num_bins = num_bins
+        self.pos_chunks = []
+        self.pos_pred = None
+        self.num_neg = 0
+
+    def add_pos(self, pos_pred):
+        if self.pos_pred is not None:
+            raise RuntimeError('positives have to be added before the negatives')
+        self.pos_chunks.append(pos_pred.detach().reshape(-1))
+
+    def _seal(self, device):
+        pos_pred = torch.cat(self.pos_chunks) if self.pos_chunks else torch.zeros(0, device=device)
+        self.pos_chunks = []
+        self.pos_pred, _ = torch.sort(pos_pred)
+        num_pos = self.pos_pred.size(0)
+        # counts of negatives by their insertion point among the sorted positives
+        self.at_least = torch.zeros(num_pos + 1, dtype=torch.long, device=pos_pred.device)
+        self.above = torch.zeros(num_pos + 1, dtype=torch.long, device=pos_pred.device)
+        self.top_neg = pos_pred.new_zeros(0)
+        # the bins span the positive range padded by its width, the rest falls into two edge bins
+        lo, hi = (self.pos_pred[0].item(), self.pos_pred[-1].item()) if num_pos else (0., 1.)
+        width = max(hi - lo, 1e-12)
+        self.hist_range = (lo - width, hi + width)
+        self.hist = torch.zeros(self.num_bins, dtype=torch.float64, device=pos_pred.device)
+        self.under, self.over = 0, 0
+        self.neg_min, self.neg_max = float('inf'), float('-inf')
+
+    def add_neg(self, neg_pred):
+        if self.pos_pred is None:
+            self._seal(neg_pred.device)
+        neg_pred = neg_pred.detach().reshape(-1).to(dtype=self.pos_pred.dtype, device=self.pos_pred.device)
+        if neg_pred.numel() == 0:
+            return
+        num_pos = self.pos_pred.size(0)
+        # a negative n ranks above every positive p < n and at least level with every p <= n
+        self.at_least += torch.bincount(torch.searchsorted(self.pos_pred, neg_pred, right=True), minlength=num_pos + 1)
+        self.above += torch.bincount(torch.searchsorted(self.pos_pred, neg_pred, right=False), minlength=num_pos + 1)
+
+        max_k = max(self.k_list) if self.k_list else 0
+        self.top_neg = torch.cat([self.top_neg, neg_pred])
+        self.top_neg = torch.topk(self.top_neg, min(max_k, self.top_neg.size(0)))[0]
+
+        lo, hi = self.hist_range
+        self.hist += torch.histc(neg_pred.double(), self.num_bins, lo, hi)
+        stats = torch.stack([(neg_pred < lo).sum(), (neg_pred > hi).sum()]).tolist()
+        self.under, self.over = self.under + stats[0], self.over + stats[1]
+        self.neg_min = min(self.neg_min, neg_pred.min().item())
+        self.neg_max = max(self.neg_max, neg_pred.max().item())
+        self.num_neg += neg_pred.size(0)
+
+    def _neg_below(self, thres: float) -> float:
+        lo, hi = self.hist_range
+        # linear interpolation inside the bin holding the threshold and inside the edge bins
+        if thres < lo:
+            return self.under * (thres - self.neg_min) / max(lo - self.neg_min, 1e-12)
+        if thres > hi:
+            return self.num_neg - self.over * (self.neg_max - thres) / max(self.neg_max - hi, 1e-12)
+        pos = (thres - lo) / (hi - lo) * self.num_bins
+        idx = min(int(pos), self.num_bins - 1)
+        return self.under + self.hist[:idx].sum().item() + (pos - idx) * self.hist[idx].item()
+
+    def compute(self) -> Dict[str, float]:
+        '''same keys and rounding as fused_metric_score, ACC_binned instead of ACC'''
+        if self.pos_pred is None:
+            self._seal(self.pos_chunks[0].device if self.pos_chunks else None)
+        pos_pred, num_neg = self.pos_pred, self.num_neg
+        # negatives inserted after position i rank above the positive i
+        optimistic_rank = self.at_least.flip(0).cumsum(0).flip(0)[1:]
+        pessimistic_rank = self.above.flip(0).cumsum(0).flip(0)[1:]
+        ranking_list = 0.5 * (optimistic_rank + pessimistic_rank).double() + 1
+
+        metrics = {}
+        for K in self.k_list:
+            if num_neg < K:
+                metrics[f'Hits@{K}'] = torch.ones((), dtype=torch.float64, device=pos_pred.device)
+            else:
+                metrics[f'Hits@{K}'] = (pos_pred > self.top_neg[K - 1]).double().mean()
+        metrics['MRR'] = (1. / ranking_list).mean()
+        for K in self.k_list:
+            metrics[f'mrr_hit{K}'] = (ranking_list <= K).double().mean()
+        metrics['AUC'] = (num_neg + 1 - ranking_list).mean() / num_neg
+
+        # precision at every distinct positive score, the negatives at least as high are the false positives
+        num_pos = pos_pred.size(0)
+        first = torch.ones(num_pos, dtype=torch.bool, device=pos_pred.device)
+        first[1:] = pos_pred[1:] != pos_pred[:-1]
+        tp = (num_pos - torch.arange(num_pos, device=pos_pred.device))[first].double()
+        fp = optimistic_rank[first].double()
+        recall_gain = -torch.diff(tp, append=tp.new_zeros(1)) / num_pos
+        metrics['AP'] = (recall_gain * tp / (tp + fp)).sum()
+
+        values = torch.stack(list(metrics.values())).tolist()
+        result = {key: round(value, 4) for key, value in zip(metrics, values)}
+
+        thres = (min(pos_pred[0].item(), self.neg_min) + max(pos_pred[-1].item(), self.neg_max)) / 2
+        pos_above = (pos_pred >= thres).sum().item()
+        result['ACC_binned'] = round((pos_above + self._neg_below(thres)) / (num_pos + num_neg), 5)
+        return result
+
+
 def get_metric_score(evaluator_hit, evaluator_mrr, pos_test_pred, neg_test_pred):
+    '''
+        ranking and classification metrics of positives against shared negatives, the evaluators
+        are kept for the callers and give the same Hits@K as fused_metric_score
+    '''
+    result = fused_metric_score(pos_test_pred, neg_test_pred)
+    result.pop('ACC')
+    return result
+
+
+def get_metric_score_sklearn(evaluator_hit, evaluator_mrr, pos_test_pred, neg_test_pred):
+    '''reference implementation through the ogb evaluator and sklearn'''
 
     k_list  = [1, 3, 10, 20, 50, 100]
     result_hit_test = evaluate_hits(evaluator_hit, pos_test_pred, neg_test_pred, k_list)
@@ -185,7 +402,8 @@ def get_metric_score(evaluator_hit, evaluator_mrr, pos_test_pred, neg_test_pred)
         f'Hits@{K}': result_hit_test[f'Hits@{K}']
         for K in [1, 3, 10, 20, 50, 100]
     }
-    result_mrr_test = evaluate_mrr(evaluator_mrr, pos_test_pred, neg_test_pred.repeat(pos_test_pred.size(0), 1))
+    # every positive is ranked against all negatives, no need to repeat them per positive
+    result_mrr_test = evaluate_mrr_shared(pos_test_pred, neg_test_pred)
 
     result['MRR'] = (result_mrr_test['MRR'])
     result['mrr_hit1']  = (result_mrr_test['mrr_hit1'])
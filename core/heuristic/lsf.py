@@ -5,7 +5,9 @@ import numpy as np
 from tqdm import tqdm
 import torch
 from torch_geometric.loader import DataLoader
-from typing import Tuple
+from typing import Dict, Iterable, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import os
 import numpy as np
 import torch
 from torch import FloatTensor
@@ -24,16 +26,8 @@ def CN(A: csr_matrix, edge_index: torch.Tensor, batch_size: int = 100000) -> Tup
     :param batch_size: int
     :return: Tuple containing a FloatTensor of scores and the pyg edge_index
     """
-    edge_index = edge_index.t()
-    link_loader = DataLoader(range(edge_index.size(0)), batch_size)
-    scores = []
-    for ind in tqdm(link_loader):
-        src, dst = edge_index[ind, 0], edge_index[ind, 1]
-        cur_scores = np.array(np.sum(A[src].multiply(A[dst]), 1)).flatten()
-        scores.append(cur_scores)
-    scores = np.concatenate(scores, 0)
-    print(f'evaluated Common Neighbours for {len(scores)} edges')
-    return torch.FloatTensor(scores), edge_index
+    scores = local_heuristics(A, edge_index, ('CN',), batch_size)['CN']
+    return scores, edge_index.t()
 
 
 def InverseRA(A: csr_matrix, edge_index: torch.Tensor, batch_size: int = 100000) -> Tuple[FloatTensor, torch.Tensor]:
@@ -44,19 +38,8 @@ def InverseRA(A: csr_matrix, edge_index: torch.Tensor, batch_size: int = 100000)
     :param batch_size: int
     :return: Tuple containing a FloatTensor of scores and the pyg edge_index
     """
-    edge_index = edge_index.t()
-    multiplier = np.exp(A.sum(axis=0))
-    multiplier[np.isinf(multiplier)] = 0
-    A_ = A.multiply(multiplier).tocsr()
-    link_loader = DataLoader(range(edge_index.size(0)), batch_size)
-    scores = []
-    for ind in tqdm(link_loader):
-        src, dst = edge_index[ind, 0], edge_index[ind, 1]
-        cur_scores = np.array(np.sum(A[src].multiply(A_[dst]), 1)).flatten()
-        scores.append(cur_scores)
-    scores = np.concatenate(scores, 0)
-    print(f'evaluated InverseRA for {len(scores)} edges')
-    return torch.FloatTensor(scores), edge_index
+    scores = local_heuristics(A, edge_index, ('InverseRA',), batch_size)['InverseRA']
+    return scores, edge_index.t()
 
 
 def AA(A: csr_matrix, edge_index: torch.Tensor, batch_size: int = 100000) -> Tuple[FloatTensor, torch.Tensor]:
@@ -67,19 +50,8 @@ def AA(A: csr_matrix, edge_index: torch.Tensor, batch_size: int = 100000) -> Tup
     :param batch_size: int
     :return: Tuple containing a FloatTensor of scores and the pyg edge_index
     """
-    edge_index = edge_index.t()
-    multiplier = 1 / np.log(A.sum(axis=0))
-    multiplier[np.isinf(multiplier)] = 0
-    A_ = A.multiply(multiplier).tocsr()
-    link_loader = DataLoader(range(edge_index.size(0)), batch_size)
-    scores = []
-    for ind in tqdm(link_loader):
-        src, dst = edge_index[ind, 0], edge_index[ind, 1]
-        cur_scores = np.array(np.sum(A[src].multiply(A_[dst]), 1)).flatten()
-        scores.append(cur_scores)
-    scores = np.concatenate(scores, 0)
-    print(f'evaluated Adamic Adar for {len(scores)} edges')
-    return torch.FloatTensor(scores), edge_index
+    scores = local_heuristics(A, edge_index, ('AA',), batch_size)['AA']
+    return scores, edge_index.t()
 
 
 def RA(A: csr_matrix, edge_index: torch.Tensor, batch_size: int = 100000) -> Tuple[FloatTensor, torch.Tensor]:
@@ -90,16 +62,130 @@ def RA(A: csr_matrix, edge_index: torch.Tensor, batch_size: int = 100000) -> Tup
     :param batch_size: int
     :return: Tuple containing a FloatTensor of scores and the pyg edge_index
     """
-    edge_index = edge_index.t()
-    multiplier = 1 / A.sum(axis=0)
-    multiplier[np.isinf(multiplier)] = 0
-    A_ = A.multiply(multiplier).tocsr()
-    link_loader = DataLoader(range(edge_index.size(0)), batch_size)
-    scores = []
-    for ind in tqdm(link_loader):
-        src, dst = edge_index[ind, 0], edge_index[ind, 1]
-        cur_scores = np.array(np.sum(A[src].multiply(A_[dst]), 1)).flatten()
-        scores.append(cur_scores)
-    scores = np.concatenate(scores, 0)
-    print(f'evaluated Resource Allocation for {len(scores)} edges')
-    return torch.FloatTensor(scores), edge_index
\ No newline at end of file
+    scores = local_heuristics(A, edge_index, ('RA',), batch_size)['RA']
+    return scores, edge_index.t()
+
+
+LOCAL_HEURISTICS = ('CN', 'AA', 'RA', 'InverseRA', 'Jaccard', 'Salton', 'Sorensen')
+
+
+def _canonical_csr(A: csr_matrix) -> csr_matrix:
+    """return a csr copy of A with sorted column indices and no duplicate entries"""
+    A = csr_matrix(A)
+    if not A.has_canonical_format:
+        A = A.copy()
+        A.sum_duplicates()
+    return A
+
+
+def _node_weights(A: csr_matrix) -> Dict[str, np.ndarray]:
+    """per common-neighbour weights, identical to the multipliers of AA, RA and InverseRA"""
+    deg = np.asarray(A.sum(axis=0), dtype=np.float64).flatten()
+    with np.errstate(divide='ignore', over='ignore'):
+        weights = {'AA': 1 / np.log(deg),
+                   'RA': 1 / deg,
+                   'InverseRA': np.exp(deg)}
+    for w in weights.values():
+        w[np.isinf(w)] = 0
+    return weights
+
+
+def _local_scores_chunk(indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, keys: np.ndarray,
+                        num_nodes: int, row_nnz: np.ndarray, weights: Dict[str, np.ndarray],
+                        src: np.ndarray, dst: np.ndarray, heuristics: Tuple[str, ...]) -> Dict[str, np.ndarray]:
+    """
+    Score one chunk of pairs in a single pass over the neighbour lists.
+    For every pair the shorter of the two sorted neighbour lists is walked and each neighbour k is
+    looked up in the other row through the global (row * num_nodes + col) key array of the CSR matrix.
+    """
+    n = src.shape[0]
+    # walk the endpoint with fewer neighbours, all scores are symmetric in (src, dst)
+    swap = row_nnz[src] > row_nnz[dst]
+    walk = np.where(swap, dst, src)
+    other = np.where(swap, src, dst)
+
+    starts = indptr[walk]
+    lens = indptr[walk + 1] - starts
+    total = int(lens.sum())
+    pair = np.repeat(np.arange(n), lens)
+    offsets = np.cumsum(lens) - lens
+    pos = np.arange(total, dtype=np.int64) - np.repeat(offsets - starts, lens)
+    nbr = indices[pos].astype(np.int64)
+
+    query = other[pair].astype(np.int64) * num_nodes + nbr
+    loc = np.searchsorted(keys, query)
+    loc[loc == keys.shape[0]] = 0
+    hit = keys[loc] == query
+
+    pair, nbr = pair[hit], nbr[hit]
+    prod = data[pos[hit]] * data[loc[hit]]
+
+    out = {}
+    cn = np.bincount(pair, weights=prod, minlength=n)
+    for name in heuristics:
+        if name in weights:
+            out[name] = np.bincount(pair, weights=prod * weights[name][nbr], minlength=n)
+        elif name == 'CN':
+            out[name] = cn
+    if any(name in ('Jaccard', 'Salton', 'Sorensen') for name in heuristics):
+        # set based normalisations use the number of shared neighbours, not the weighted count
+        shared = np.bincount(pair, minlength=n).astype(np.float64)
+        deg_s, deg_d = row_nnz[src].astype(np.float64), row_nnz[dst].astype(np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if 'Jaccard' in heuristics:
+                out['Jaccard'] = np.nan_to_num(shared / (deg_s + deg_d - shared))
+            if 'Salton' in heuristics:
+                out['Salton'] = np.nan_to_num(shared / np.sqrt(deg_s * deg_d))
+            if 'Sorensen' in heuristics:
+                out['Sorensen'] = np.nan_to_num(2 * shared / (deg_s + deg_d))
+    return out
+
+
+def local_heuristics(A: csr_matrix, edge_index: torch.Tensor,
+                     heuristics: Iterable[str] = ('CN', 'AA', 'RA', 'InverseRA'),
+                     batch_size: int = 100000, num_workers: int = None) -> Dict[str, FloatTensor]:
+    """
+    Compute several local structural heuristics in one pass over the sorted CSR neighbour lists.
+    CN, AA, RA and InverseRA give the same values as the per-heuristic functions in this module,
+    Jaccard, Salton and Sorensen are normalised by the number of neighbours of both endpoints.
+    Chunks of batch_size pairs are scored in a thread pool, numpy releases the GIL in the
+    searchsorted / bincount kernels so the workers run concurrently.
+    :param A: scipy sparse adjacency matrix
+    :param edge_index: pyg edge_index (torch.Tensor of shape [2, num_edges])
+    :param heuristics: names out of LOCAL_HEURISTICS
+    :param batch_size: int, number of pairs scored per chunk
+    :param num_workers: int, number of threads, defaults to os.cpu_count()
+    :return: Dict mapping each heuristic name to a FloatTensor of scores aligned with edge_index
+    """
+    heuristics = tuple(heuristics)
+    unknown = set(heuristics) - set(LOCAL_HEURISTICS)
+    if unknown:
+        raise ValueError(f'unknown local heuristics {sorted(unknown)}, choose from {LOCAL_HEURISTICS}')
+
+    A = _canonical_csr(A)
+    num_nodes = A.shape[0]
+    indptr = A.indptr.astype(np.int64)
+    row_nnz = np.diff(indptr)
+    keys = np.repeat(np.arange(num_nodes, dtype=np.int64), row_nnz) * num_nodes + A.indices
+    data = A.data.astype(np.float64)
+    weights = {k: v for k, v in _node_weights(A).items() if k in heuristics}
+
+    edges = torch.as_tensor(edge_index).cpu().numpy().astype(np.int64)
+    num_edges = edges.shape[1]
+    bounds = list(range(0, num_edges, batch_size))
+
+    def score(start):
+        src, dst = edges[0, start:start + batch_size], edges[1, start:start + batch_size]
+        return _local_scores_chunk(indptr, A.indices, data, keys, num_nodes, row_nnz, weights,
+                                   src, dst, heuristics)
+
+    num_workers = num_workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        chunks = list(tqdm(pool.map(score, bounds), total=len(bounds)))
+
+    scores = {}
+    for name in heuristics:
+        cur = np.concatenate([c[name] for c in chunks], 0) if chunks else np.zeros(0)
+        scores[name] = torch.FloatTensor(cur)
+    print(f'evaluated {", ".join(heuristics)} for {num_edges} edges')
+    return scores
@@ -5,8 +5,10 @@ import pandas as pd
 import os, sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from torch_geometric.transforms import RandomLinkSplit
+from torch_geometric import seed_everything
 from data_utils.dataset import CustomPygDataset, CustomLinkDataset
 from heuristic.lsf import CN, AA, RA, InverseRA
+from heuristic.score_store import HeuristicScoreStore
 from heuristic.gsf import Ben_PPR, shortest_path, katz_apro, katz_close , SymPPR
 import matplotlib.pyplot as plt
 from core.data_utils.graph_stats import construct_sparse_adj, plot_coo_matrix, plot_pos_neg_adj
@@ -117,9 +119,11 @@ def eval_ogbn_products_acc(name='ogbn_products'):
     return result_acc
 
 
-def eval_heuristic_mrr_hits(name='ogbn_products'):
+def eval_heuristic_mrr_hits(name='ogbn_products', seed: int = 0):
     """eval heuristic using mrr and hits from ogb.evaluator"""
 
+    # RandomLinkSplit is unseeded otherwise and every run would store a new split
+    seed_everything(seed)
     dataset, text, splits = get_raw_text_products(undirected = True,
                                                 include_negatives = True,
                                                 val_pct = 0.15,
@@ -145,29 +149,30 @@ def eval_heuristic_mrr_hits(name='ogbn_products'):
     neg_m = construct_sparse_adj(neg_test_index)
     plot_coo_matrix(neg_m, f'{name}_neg_index.png')
     
+    store = HeuristicScoreStore(name, seed=seed, val_pct=0.15, test_pct=0.05)
     evaluator_hit = Evaluator(name='ogbl-collab')
     evaluator_mrr = Evaluator(name='ogbl-citation2')
     
     result_dict = {}
     # , 'InverseRA'
     for use_heuristic in ['CN', 'AA', 'RA']:
-        pos_test_pred, _ = eval(use_heuristic)(full_A, pos_test_index)
-        neg_test_pred, _ = eval(use_heuristic)(full_A, neg_test_index)
+        pos_test_pred = store.score(use_heuristic, eval(use_heuristic), full_A, pos_test_index, 'pos')
+        neg_test_pred = store.score(use_heuristic, eval(use_heuristic), full_A, neg_test_index, 'neg')
         
         result = get_metric_score(evaluator_hit, evaluator_mrr, pos_test_pred, neg_test_pred)
         result_dict.update({f'{use_heuristic}': result})
         
     # , 'SymPPR'
     for use_heuristic in ['Ben_PPR']:
-        pos_test_pred, _ = eval(use_heuristic)(full_A, pos_test_index)
-        neg_test_pred, _ = eval(use_heuristic)(full_A, neg_test_index)
+        pos_test_pred = store.score(use_heuristic, eval(use_heuristic), full_A, pos_test_index, 'pos')
+        neg_test_pred = store.score(use_heuristic, eval(use_heuristic), full_A, neg_test_index, 'neg')
         result = get_metric_score(evaluator_hit, evaluator_mrr, pos_test_pred, neg_test_pred)
         result_dict.update({f'{use_heuristic}': result})
     
     #  'katz_close'
     for use_heuristic in ['shortest_path', 'katz_apro']:
-        pos_test_pred = eval(use_heuristic)(full_A, pos_test_index)
-        neg_test_pred = eval(use_heuristic)(full_A, neg_test_index)
+        pos_test_pred = store.score(use_heuristic, eval(use_heuristic), full_A, pos_test_index, 'pos')
+        neg_test_pred = store.score(use_heuristic, eval(use_heuristic), full_A, neg_test_index, 'neg')
         result = get_metric_score(evaluator_hit, evaluator_mrr, pos_test_pred, neg_test_pred)
 
         # calc mrr and hits@k
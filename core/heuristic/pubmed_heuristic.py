@@ -9,6 +9,7 @@ import torch_geometric.transforms as T
 from sklearn.preprocessing import normalize
 import json
 from torch_geometric.transforms import RandomLinkSplit
+from torch_geometric import seed_everything
 import pandas as pd
 from torch_geometric.data import Data, InMemoryDataset
 import matplotlib.pyplot as plt
@@ -16,6 +17,7 @@ from core.data_utils.graph_stats import construct_sparse_adj, plot_coo_matrix, p
 import scipy.sparse as ssp
 
 from heuristic.lsf import CN, AA, RA, InverseRA
+from heuristic.score_store import HeuristicScoreStore
 from heuristic.gsf import Ben_PPR, shortest_path, katz_apro, katz_close , SymPPR
 from typing import Dict
 from torch_geometric.data import Dataset
@@ -105,8 +107,10 @@ def eval_pubmed_acc(name) -> Dict:
     return result_acc
 
 
-def eval_pubmed_mrr(name):
+def eval_pubmed_mrr(name, seed: int = 0):
     
+    # fixed split and negatives, so that the stored scores are found again
+    seed_everything(seed)
     dataset, data_pubid, splits = get_pubmed_lp(
                             undirected = True,
                             include_negatives = True,
@@ -133,29 +137,30 @@ def eval_pubmed_mrr(name):
     neg_m = construct_sparse_adj(neg_test_index)
     plot_coo_matrix(neg_m, f'{name}_test_neg_index.png')
     
+    store = HeuristicScoreStore(name, seed=seed, val_pct=0.15, test_pct=0.05)
     evaluator_hit = Evaluator(name='ogbl-collab')
     evaluator_mrr = Evaluator(name='ogbl-citation2')
     
     result_mrr = {}
     # 'InverseRA'
     for use_heuristic in ['CN', 'AA', 'RA']:
-        pos_test_pred, _ = eval(use_heuristic)(full_A, pos_test_index)
-        neg_test_pred, _ = eval(use_heuristic)(full_A, neg_test_index)
+        pos_test_pred = store.score(use_heuristic, eval(use_heuristic), full_A, pos_test_index, 'pos')
+        neg_test_pred = store.score(use_heuristic, eval(use_heuristic), full_A, neg_test_index, 'neg')
         
         result = get_metric_score(evaluator_hit, evaluator_mrr, pos_test_pred, neg_test_pred)
         result_mrr.update({f'{use_heuristic}': result})
 
     # , 'SymPPR'
     for use_heuristic in ['Ben_PPR']:
-        pos_test_pred, _ = eval(use_heuristic)(full_A, pos_test_index)
-        neg_test_pred, _ = eval(use_heuristic)(full_A, neg_test_index)
+        pos_test_pred = store.score(use_heuristic, eval(use_heuristic), full_A, pos_test_index, 'pos')
+        neg_test_pred = store.score(use_heuristic, eval(use_heuristic), full_A, neg_test_index, 'neg')
         result = get_metric_score(evaluator_hit, evaluator_mrr, pos_test_pred, neg_test_pred)
         result_mrr.update({f'{use_heuristic}': result})
     
     
     for use_heuristic in ['shortest_path', 'katz_apro', 'katz_close']:
-        pos_test_pred = eval(use_heuristic)(full_A, pos_test_index)
-        neg_test_pred = eval(use_heuristic)(full_A, neg_test_index)
+        pos_test_pred = store.score(use_heuristic, eval(use_heuristic), full_A, pos_test_index, 'pos')
+        neg_test_pred = store.score(use_heuristic, eval(use_heuristic), full_A, neg_test_index, 'neg')
         result = get_metric_score(evaluator_hit, evaluator_mrr, pos_test_pred, neg_test_pred)
         result_mrr.update({f'{use_heuristic}': result})
 
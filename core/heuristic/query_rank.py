@@ -0,0 +1,74 @@
+"""
+Per-query ranking of a positive against its own negatives, as in HeaRT and ogbl-citation2.
+Every query is a row [positive, negative_1, ..., negative_K]. The (source, target) pairs of all rows are
+deduplicated, each distinct pair is scored once in large batches and the scores are scattered back into a
+[P, K + 1] matrix that is ranked row by row.
+"""
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from typing import Callable, Dict, Sequence, Tuple
+import torch
+from tqdm import tqdm
+
+
+def query_pairs(pos_edge: torch.Tensor, neg: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    :param pos_edge: pyg edge_index of the positives (torch.Tensor of shape [2, P])
+    :param neg: negatives of every positive, either targets sharing the source of the positive
+                (ogbl-citation2 target_node_neg, shape [P, K]) or full pairs (HeaRT, shape [P, K, 2])
+    :return: source and target of shape [P, K + 1], column 0 holds the positive
+    """
+    src, dst = pos_edge[0].view(-1, 1), pos_edge[1].view(-1, 1)
+    neg = neg.to(pos_edge.device)
+    if neg.dim() == 2:
+        return torch.cat([src, src.expand_as(neg)], 1), torch.cat([dst, neg], 1)
+    return torch.cat([src, neg[..., 0]], 1), torch.cat([dst, neg[..., 1]], 1)
+
+
+def score_queries(score_fn: Callable, pos_edge: torch.Tensor, neg: torch.Tensor,
+                  batch_size: int = 65536) -> torch.Tensor:
+    """
+    Score every query row, each distinct (source, target) pair is passed to score_fn only once.
+    :param score_fn: score_fn(edge_index [2, B]) -> B scores, see heuristic_scorer and predictor_scorer
+                     of heuristic/stream_score.py
+    :param batch_size: number of distinct pairs per score_fn call
+    :return: FloatTensor of shape [P, K + 1], column 0 holds the score of the positive
+    """
+    src, dst = query_pairs(pos_edge, neg)
+    num_nodes = int(max(src.max(), dst.max())) + 1 if src.numel() else 1
+    keys, inverse = torch.unique(src.reshape(-1) * num_nodes + dst.reshape(-1), return_inverse=True)
+
+    scores = []
+    for key in tqdm(torch.split(keys, batch_size)):
+        edge_index = torch.stack([key // num_nodes, key % num_nodes])
+        scores.append(torch.as_tensor(score_fn(edge_index), dtype=torch.float).view(-1).cpu())
+    scores = torch.cat(scores) if scores else torch.zeros(0)
+    print(f'scored {keys.numel()} distinct pairs for {src.numel()} query entries')
+    return scores[inverse.view(-1).cpu()].view(src.shape)
+
+
+def rank_queries(scores: torch.Tensor, k_list: Sequence[int] = (1, 3, 10, 20, 50, 100)) -> Dict[str, float]:
+    """
+    Rank the positive of every row against the negatives of the same row, ties share the mean rank as in eval_mrr.
+    :param scores: [P, K + 1] scores of score_queries
+    :return: MRR and mrr_hit@K as returned by evaluate_mrr
+    """
+    pos, neg = scores[:, :1], scores[:, 1:]
+    optimistic_rank = (neg >= pos).sum(dim=1)
+    pessimistic_rank = (neg > pos).sum(dim=1)
+    ranking_list = 0.5 * (optimistic_rank + pessimistic_rank) + 1
+
+    results = {'MRR': round((1. / ranking_list.to(torch.float)).mean().item(), 4)}
+    for K in k_list:
+        results[f'mrr_hit{K}'] = round((ranking_list <= K).to(torch.float).mean().item(), 4)
+    return results
+
+
+def evaluate_queries(score_fn: Callable, pos_edge: torch.Tensor, neg: torch.Tensor, batch_size: int = 65536,
+                     k_list: Sequence[int] = (1, 3, 10, 20, 50, 100)) -> Dict[str, float]:
+    """
+    Per-query MRR of any scorer, e.g. with the scorers of heuristic/stream_score.py
+        evaluate_queries(heuristic_scorer(CN, A), pos_edge, split['target_node_neg'])
+        evaluate_queries(predictor_scorer(model.decoder, h), pos_edge, heart_test_neg)
+    """
+    return rank_queries(score_queries(score_fn, pos_edge, neg, batch_size), k_list)
@@ -0,0 +1,91 @@
+"""
+Per-edge rank artifacts of one evaluation, so error analysis and plots need neither the model nor a dense
+comparison of every positive with every negative.
+An artifact is a directory of .npy columns, loaded back memory-mapped:
+    pos_src, pos_dst, pos_score, pos_rank    one row per positive
+    neg_src, neg_dst, neg_score, neg_rank    one row per negative (flattened for per-query negatives)
+    meta.json                                  number of edges, layout and any user metadata
+pos_rank is the rank of the positive among its negatives as in eval_mrr (ties share the mean rank),
+neg_rank is 1 + the number of positives scored at or above the negative, ties counting one half, i.e. the
+negative error ranks of analysis/visual.py shifted by 2 (they count from -1).
+"""
+import os
+import json
+from typing import Dict, Tuple
+import numpy as np
+import torch
+
+COLUMNS = ('src', 'dst', 'score', 'rank')
+
+
+def _numpy(x) -> np.ndarray:
+    return torch.as_tensor(x).detach().cpu().numpy()
+
+
+def shared_ranks(pos_pred, neg_pred) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ranks of positives and negatives against each other with negatives shared by all positives,
+    two sorts and four binary searches instead of a P x N comparison
+    """
+    pos, neg = _numpy(pos_pred).reshape(-1), _numpy(neg_pred).reshape(-1)
+    pos_sorted, neg_sorted = np.sort(pos), np.sort(neg)
+    # negatives >= / > the positive
+    optimistic = neg.size - np.searchsorted(neg_sorted, pos, side='left')
+    pessimistic = neg.size - np.searchsorted(neg_sorted, pos, side='right')
+    pos_rank = 0.5 * (optimistic + pessimistic) + 1
+    # positives >= / > the negative
+    at_or_above = pos.size - np.searchsorted(pos_sorted, neg, side='left')
+    above = pos.size - np.searchsorted(pos_sorted, neg, side='right')
+    neg_rank = 0.5 * (at_or_above + above) + 1
+    return pos_rank, neg_rank
+
+
+def query_ranks(pos_pred, neg_pred) -> Tuple[np.ndarray, np.ndarray]:
+    """same as shared_ranks for per-query negatives neg_pred of shape [P, K], e.g. HeaRT hard negatives"""
+    pos, neg = _numpy(pos_pred).reshape(-1, 1), _numpy(neg_pred).reshape(pos_pred.shape[0], -1)
+    pos_rank = 0.5 * ((neg >= pos).sum(1) + (neg > pos).sum(1)) + 1
+    neg_rank = 0.5 * ((pos >= neg).astype(np.float64) + (pos > neg)) + 1
+    return pos_rank, neg_rank.reshape(-1)
+
+
+def save_rank_artifact(path: str, pos_edge_index, pos_pred, neg_edge_index, neg_pred, meta: Dict = None) -> None:
+    """
+    :param path: directory of the artifact, e.g. <run_dir>/<data>_test_ranks
+    :param pos_edge_index: pyg edge_index of the positives (shape [2, P])
+    :param pos_pred: scores of the positives (shape [P])
+    :param neg_edge_index: pyg edge_index of the negatives, [2, N] or [2, P * K] for per-query negatives
+    :param neg_pred: scores of the negatives, [N] when shared by all positives or [P, K] per query
+    :param meta: json serializable metadata, e.g. model and epoch
+    """
+    per_query = torch.as_tensor(neg_pred).dim() == 2 and torch.as_tensor(neg_pred).size(1) > 1
+    pos_rank, neg_rank = (query_ranks if per_query else shared_ranks)(pos_pred, neg_pred)
+    pos_edge, neg_edge = _numpy(pos_edge_index).reshape(2, -1), _numpy(neg_edge_index).reshape(2, -1)
+    num_nodes = int(max(pos_edge.max(initial=0), neg_edge.max(initial=0))) + 1
+    index_dtype = np.int32 if num_nodes < 2 ** 31 else np.int64
+
+    columns = {
+        'pos': (pos_edge[0], pos_edge[1], _numpy(pos_pred).reshape(-1), pos_rank),
+        'neg': (neg_edge[0], neg_edge[1], _numpy(neg_pred).reshape(-1), neg_rank),
+    }
+    os.makedirs(path, exist_ok=True)
+    for split, values in columns.items():
+        for name, value in zip(COLUMNS, values):
+            dtype = index_dtype if name in ('src', 'dst') else np.float32
+            np.save(os.path.join(path, f'{split}_{name}.npy'), np.ascontiguousarray(value, dtype=dtype))
+    header = {'num_pos': int(pos_edge.shape[1]), 'num_neg': int(neg_edge.shape[1]),
+              'negatives': 'per_query' if per_query else 'shared', **(meta or {})}
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(header, f, default=str)
+    print(f'saved ranks of {header["num_pos"]} positives and {header["num_neg"]} negatives to {path}')
+
+
+def load_rank_artifact(path: str) -> Dict:
+    """
+    :return: {'pos': {column: memmap}, 'neg': {column: memmap}, 'meta': dict}, nothing is read before it is used
+    """
+    with open(os.path.join(path, 'meta.json')) as f:
+        artifact = {'meta': json.load(f)}
+    for split in ('pos', 'neg'):
+        artifact[split] = {name: np.load(os.path.join(path, f'{split}_{name}.npy'), mmap_mode='r')
+                           for name in COLUMNS}
+    return artifact
@@ -0,0 +1,107 @@
+"""
+On-disk store of heuristic scores, so repeated analysis, plotting and sweeps compute every heuristic only once
+"""
+import os
+import json
+import hashlib
+from typing import Callable, Dict, Optional
+import numpy as np
+import scipy.sparse as ssp
+import torch
+
+DEFAULT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'dataset', 'heuristic_scores'))
+
+
+def edge_fingerprint(edge_index) -> str:
+    """sha1 of the int64 edge index, identifies the order of the scored edges"""
+    edges = np.ascontiguousarray(torch.as_tensor(edge_index).cpu().numpy().astype(np.int64))
+    return hashlib.sha1(str(edges.shape).encode() + edges.tobytes()).hexdigest()
+
+
+def graph_fingerprint(A) -> str:
+    """sha1 of the CSR arrays of the message passing graph, scores on another graph (e.g. another LCC) never match"""
+    A = ssp.csr_matrix(A)
+    digest = hashlib.sha1(str(A.shape).encode())
+    for arr in (A.indptr, A.indices, A.data):
+        digest.update(np.ascontiguousarray(arr).tobytes())
+    return digest.hexdigest()
+
+
+class HeuristicScoreStore:
+    """
+    Memory-mapped float32 score columns, one directory per split and heuristic:
+    root/<dataset>/seed<seed>_val<val_pct>_test<test_pct>/<heuristic>/<params and graph hash>/<column>.npy
+    The directory is keyed by the heuristic parameters and the fingerprint of the message passing graph A.
+    Each column is stored next to a json header holding the parameters and the fingerprint of the edge index
+    it is aligned with, a column is only served back for the very same edges on the very same graph.
+    """
+
+    def __init__(self, dataset: str, seed=0, val_pct: float = 0.15, test_pct: float = 0.05,
+                 root: str = DEFAULT_ROOT):
+        self.dataset = dataset
+        self.split = f'seed{seed}_val{val_pct}_test{test_pct}'
+        self.root = root
+        # the drivers score several columns on one graph, hash it once; the reference keeps id(A) unique
+        self._graphs = {}
+
+    def _graph_key(self, A) -> str:
+        if id(A) not in self._graphs:
+            self._graphs[id(A)] = (A, graph_fingerprint(A))
+        return self._graphs[id(A)][1]
+
+    def _dir(self, heuristic: str, params: Dict, A) -> str:
+        params_key = json.dumps(params, sort_keys=True, default=str) + self._graph_key(A)
+        params_hash = hashlib.sha1(params_key.encode()).hexdigest()[:12]
+        return os.path.join(self.root, self.dataset, self.split, heuristic, params_hash)
+
+    def load(self, heuristic: str, column: str, A, edge_index, params: Optional[Dict] = None) -> Optional[np.ndarray]:
+        """
+        :return: the memory-mapped scores of column for edge_index on the graph A, None if they are not stored
+        """
+        path = self._dir(heuristic, params or {}, A)
+        try:
+            with open(os.path.join(path, f'{column}.json')) as f:
+                header = json.load(f)
+        except FileNotFoundError:
+            return None
+        if header['fingerprint'] != edge_fingerprint(edge_index):
+            return None
+        # copy-on-write keeps the file untouched while torch gets a writable array
+        return np.load(os.path.join(path, f'{column}.npy'), mmap_mode='c')
+
+    def save(self, heuristic: str, column: str, A, edge_index, scores, params: Optional[Dict] = None) -> None:
+        path = self._dir(heuristic, params or {}, A)
+        os.makedirs(path, exist_ok=True)
+        scores = np.asarray(torch.as_tensor(scores).cpu().numpy(), dtype=np.float32)
+        # write to temporary files first so that readers never see half a column
+        tmp = os.path.join(path, f'.{column}.{os.getpid()}.npy')
+        np.save(tmp, scores)
+        os.replace(tmp, os.path.join(path, f'{column}.npy'))
+        header = {'dataset': self.dataset, 'split': self.split, 'heuristic': heuristic,
+                  'params': params or {}, 'num_edges': int(scores.shape[0]),
+                  'fingerprint': edge_fingerprint(edge_index), 'graph': self._graph_key(A)}
+        tmp = os.path.join(path, f'.{column}.{os.getpid()}.json')
+        with open(tmp, 'w') as f:
+            json.dump(header, f, default=str)
+        os.replace(tmp, os.path.join(path, f'{column}.json'))
+
+    def score(self, heuristic: str, func: Callable, A, edge_index, column: str, **params) -> torch.Tensor:
+        """
+        Return the stored scores of heuristic on edge_index, or compute func(A, edge_index, **params) and store them.
+        :param heuristic: name of the heuristic, part of the key
+        :param func: a heuristic of core/heuristic, may return the scores alone or a tuple starting with them,
+                     the scores have to be in the order of edge_index
+        :param A: A CSR matrix using the 'message passing' edges
+        :param edge_index: The supervision edges to be scored
+        :param column: e.g. 'pos' or 'neg'
+        :return: FloatTensor of scores aligned with edge_index
+        """
+        scores = self.load(heuristic, column, A, edge_index, params)
+        if scores is not None:
+            print(f'loaded {heuristic} for {len(scores)} edges from {self.dataset}/{self.split}')
+            return torch.from_numpy(scores)
+        scores = func(A, edge_index, **params)
+        if isinstance(scores, tuple):
+            scores = scores[0]
+        self.save(heuristic, column, A, edge_index, scores, params)
+        return torch.as_tensor(scores, dtype=torch.float32)
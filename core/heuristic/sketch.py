@@ -0,0 +1,135 @@
+"""
+Sketch based approximations of CN, Jaccard, AA and RA for graphs where the exact local heuristics get too expensive
+"""
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from typing import Dict, Iterable
+import numpy as np
+import torch
+from torch import FloatTensor
+from scipy.sparse import csr_matrix
+from tqdm import tqdm
+
+from heuristic.lsf import _canonical_csr, _node_weights
+
+SKETCH_HEURISTICS = ('CN', 'Jaccard', 'AA', 'RA')
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    """64-bit finalizer of splitmix64, a bijection on uint64 that spreads consecutive ids uniformly"""
+    with np.errstate(over='ignore'):
+        z = x + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+class SketchHeuristics(object):
+    """
+    MinHash sketches of the 1-hop neighbourhood of every node, built once with num_perm seeded 64-bit hash functions.
+    Besides the num_perm minimum hash values each node keeps the id of the neighbour that attains each minimum,
+    so that a matching position is a uniform sample of the common neighbours and weighted scores (AA, RA) can be
+    estimated too. With exact degrees the union size follows from the Jaccard estimate, |N(u) u N(v)| =
+    (d_u + d_v) / (1 + J), so no HyperLogLog registers are needed.
+    Every hash function is a bijection of the 64-bit node ids, so distinct neighbours never collide.
+    Memory is 12 * num_perm bytes per node and every pair costs O(num_perm), whatever the degrees.
+    """
+
+    def __init__(self, A: csr_matrix, num_perm: int = 128, batch_nnz: int = 2 ** 16, seed: int = None):
+        """
+        :param A: scipy sparse adjacency matrix
+        :param num_perm: number of minhash permutations, the sketch size
+        :param batch_nnz: number of adjacency entries hashed at once, a batch takes about 17 * num_perm * batch_nnz
+                          bytes whatever the degrees, rows longer than a batch are reduced over several batches
+        :param seed: seed of the hash functions, drawn from the torch RNG if None
+        """
+        A = _canonical_csr(A)
+        self.num_nodes = A.shape[0]
+        self.num_perm = num_perm
+        self.degree = np.diff(A.indptr).astype(np.float64)
+        self.weights = _node_weights(A)
+
+        if seed is None:
+            seeds = torch.randint(0, 2 ** 62, (num_perm,)).numpy()
+        else:
+            seeds = np.random.default_rng(seed).integers(0, 2 ** 62, num_perm)
+        self.seeds = seeds.astype(np.uint64)
+        self._empty = np.iinfo(np.uint64).max
+        self.minhash = np.full((self.num_nodes, num_perm), self._empty, dtype=np.uint64)
+        id_dtype = np.int32 if self.num_nodes < 2 ** 31 else np.int64
+        self.argmin = np.full((self.num_nodes, num_perm), -1, dtype=id_dtype)
+
+        nnz = A.indptr[-1]
+        for lo in tqdm(range(0, nnz, batch_nnz)):
+            hi = min(lo + batch_nnz, nnz)
+            neighbours = A.indices[lo:hi]
+            hashes = self.hash(neighbours)
+            # the batch covers the tail of one row, whole rows and the head of another one
+            entry_row = np.searchsorted(A.indptr, np.arange(lo, hi), side='right') - 1
+            starts = np.flatnonzero(np.diff(entry_row, prepend=-1))
+            rows = entry_row[starts]
+            segment = np.repeat(np.arange(starts.shape[0]), np.diff(np.append(starts, hi - lo)))
+            mins = np.minimum.reduceat(hashes, starts, axis=0)
+            entry, perm = np.nonzero(hashes == mins[segment])
+            argmin = np.full(mins.shape, -1, dtype=id_dtype)
+            argmin[segment[entry], perm] = neighbours[entry]
+            # a row split over batches keeps the smaller minimum
+            better = mins < self.minhash[rows]
+            self.minhash[rows] = np.where(better, mins, self.minhash[rows])
+            self.argmin[rows] = np.where(better, argmin, self.argmin[rows])
+
+    def hash(self, nodes: np.ndarray) -> np.ndarray:
+        """hash values of the nodes under every permutation, uint64 [len(nodes), num_perm]"""
+        return _splitmix64(np.asarray(nodes).astype(np.uint64)[:, None] ^ self.seeds[None, :])
+
+    def theoretical_error(self, delta: float = 0.05) -> Dict[str, float]:
+        """
+        Error of the Jaccard estimate for the chosen sketch size.
+        jaccard_std is the worst case standard deviation sqrt(J(1 - J) / num_perm) <= 1 / (2 sqrt(num_perm)),
+        jaccard_bound holds with probability 1 - delta (Hoeffding). The CN estimate of a pair (u, v) is off by
+        at most jaccard_bound * (d_u + d_v), AA and RA by the same factor times their largest node weight.
+        """
+        return {'jaccard_std': float(0.5 / np.sqrt(self.num_perm)),
+                'jaccard_bound': float(np.sqrt(np.log(2 / delta) / (2 * self.num_perm)))}
+
+    def estimate(self, edge_index: torch.Tensor, heuristics: Iterable[str] = SKETCH_HEURISTICS,
+                 batch_size: int = 100000) -> Dict[str, FloatTensor]:
+        """
+        :param edge_index: pyg edge_index (torch.Tensor of shape [2, num_edges])
+        :param heuristics: names out of SKETCH_HEURISTICS
+        :param batch_size: number of pairs estimated at once
+        :return: Dict mapping each heuristic name to a FloatTensor of estimates aligned with edge_index
+        """
+        heuristics = tuple(heuristics)
+        unknown = set(heuristics) - set(SKETCH_HEURISTICS)
+        if unknown:
+            raise ValueError(f'unknown sketch heuristics {sorted(unknown)}, choose from {SKETCH_HEURISTICS}')
+        edges = torch.as_tensor(edge_index).cpu().numpy().astype(np.int64)
+        scores = {name: [] for name in heuristics}
+        for start in tqdm(range(0, edges.shape[1], batch_size)):
+            src, dst = edges[0, start:start + batch_size], edges[1, start:start + batch_size]
+            match = (self.minhash[src] == self.minhash[dst]) & (self.argmin[src] >= 0)
+            jaccard = match.mean(1)
+            union = (self.degree[src] + self.degree[dst]) / (1 + jaccard)
+            for name in heuristics:
+                if name == 'Jaccard':
+                    cur = jaccard
+                elif name == 'CN':
+                    cur = jaccard * union
+                else:
+                    # a matching position samples the argmin uniformly from the union
+                    weight = self.weights[name][self.argmin[src]]
+                    cur = union * np.where(match, weight, 0).mean(1)
+                scores[name].append(cur)
+        print(f'estimated {", ".join(heuristics)} for {edges.shape[1]} edges with {self.num_perm} permutations')
+        return {name: torch.FloatTensor(np.concatenate(cur, 0) if cur else np.zeros(0))
+                for name, cur in scores.items()}
+
+
+def sketch_heuristics(A: csr_matrix, edge_index: torch.Tensor, heuristics: Iterable[str] = SKETCH_HEURISTICS,
+                      num_perm: int = 128) -> Dict[str, FloatTensor]:
+    """
+    Approximate CN, Jaccard, AA and RA, see SketchHeuristics. Build SketchHeuristics once and call estimate
+    when several edge sets are scored on the same graph.
+    """
+    return SketchHeuristics(A, num_perm).estimate(edge_index, heuristics)
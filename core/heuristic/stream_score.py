@@ -0,0 +1,162 @@
+"""
+Out-of-core scoring of candidate edge files.
+Candidate pairs are read from disk in fixed-size chunks, every chunk is scored with a heuristic of core/heuristic
+or a trained predictor and the scores go straight into a memory-mapped .npy file, so the peak memory is bounded
+by the chunk size and not by the number of candidates.
+
+Supported edge files
+    .npy            int array of shape [..., 2] (e.g. HeaRT negatives [P, K, 2]) or [2, E], read via mmap
+    .bin / .i64     raw little-endian int64 pairs, src0 dst0 src1 dst1 ...
+    anything else   text with one pair per line, separated by tabs, spaces or commas
+"""
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from typing import Callable, Iterator, Tuple
+import numpy as np
+import pandas as pd
+import torch
+from tqdm import tqdm
+
+RAW_SUFFIXES = ('.bin', '.i64')
+
+
+def _count_lines(path: str, skiprows: int = 0, buffer_size: int = 2 ** 24) -> int:
+    num_lines, last = 0, b'\n'
+    with open(path, 'rb') as f:
+        while True:
+            buf = f.read(buffer_size)
+            if not buf:
+                break
+            num_lines += buf.count(b'\n')
+            last = buf[-1:]
+    # the last line may miss its newline
+    num_lines += last != b'\n'
+    return max(num_lines - skiprows, 0)
+
+
+def edge_file_shape(path: str, skiprows: int = 0) -> Tuple[int, ...]:
+    """
+    :return: shape of the scores of the edge file, the pair dimension removed
+    """
+    if path.endswith('.npy'):
+        shape = np.load(path, mmap_mode='r').shape
+        if shape[-1] == 2:
+            return shape[:-1]
+        if len(shape) == 2 and shape[0] == 2:
+            return shape[1:]
+        raise ValueError(f'{path} has shape {shape}, expected [..., 2] or [2, E]')
+    if path.endswith(RAW_SUFFIXES):
+        size = os.path.getsize(path)
+        if size % 16:
+            raise ValueError(f'{path} has {size} bytes, not a multiple of one int64 pair')
+        return (size // 16,)
+    return (_count_lines(path, skiprows),)
+
+
+def iter_edge_chunks(path: str, chunk_size: int = 1000000, sep: str = None,
+                     skiprows: int = 0) -> Iterator[torch.Tensor]:
+    """
+    Read the pairs of an edge file in order, chunk_size pairs at a time.
+    :param sep: column separator of text files, tabs, spaces and commas are recognized when None
+    :param skiprows: header lines of text files
+    :return: iterator of pyg edge_index chunks (torch.LongTensor of shape [2, <= chunk_size])
+    """
+    if path.endswith('.npy') or path.endswith(RAW_SUFFIXES):
+        if path.endswith('.npy'):
+            edges = np.load(path, mmap_mode='r')
+            if edges.shape[-1] != 2:
+                # [2, E], a transposed view keeps the chunks lazy
+                edges = edges.T
+            edges = edges.reshape(-1, 2)
+        else:
+            edges = np.memmap(path, dtype='<i8', mode='r').reshape(-1, 2)
+        for start in range(0, edges.shape[0], chunk_size):
+            chunk = np.array(edges[start:start + chunk_size], dtype=np.int64)
+            yield torch.from_numpy(chunk.T.copy())
+        return
+
+    if sep is None:
+        with open(path) as f:
+            for _ in range(skiprows):
+                f.readline()
+            sep = ',' if ',' in f.readline() else r'\s+'
+    # pandas runs r'\s+' on its C parser as well
+    reader = pd.read_csv(path, sep=sep, header=None, usecols=[0, 1], dtype=np.int64,
+                         skiprows=skiprows, chunksize=chunk_size)
+    for chunk in reader:
+        yield torch.from_numpy(chunk.to_numpy().T.copy())
+
+
+def heuristic_scorer(func: Callable, A, **params) -> Callable[[torch.Tensor], np.ndarray]:
+    """
+    :param func: a heuristic of core/heuristic, func(A, edge_index, **params)
+    :param A: A CSR matrix using the 'message passing' edges
+    :return: score_fn for stream_score
+    """
+    def score_fn(edge_index: torch.Tensor) -> np.ndarray:
+        scores = func(A, edge_index, **params)
+        if isinstance(scores, tuple):
+            scores = scores[0]
+        return torch.as_tensor(scores).cpu().numpy()
+    return score_fn
+
+
+def predictor_scorer(predictor: Callable, h: torch.Tensor, batch_size: int = None) -> Callable[[torch.Tensor], np.ndarray]:
+    """
+    :param predictor: trained link predictor called as predictor(h[src], h[dst]), e.g. a decoder of custom_score.py
+    :param h: node embeddings of the encoder, the chunks are moved to their device
+    :param batch_size: pairs per predictor call, defaults to the whole chunk
+    :return: score_fn for stream_score
+    """
+    @torch.no_grad()
+    def score_fn(edge_index: torch.Tensor) -> np.ndarray:
+        edge_index = edge_index.to(h.device)
+        step = batch_size or max(edge_index.size(1), 1)
+        preds = [predictor(h[edge[0]], h[edge[1]]).view(-1).cpu()
+                 for edge in torch.split(edge_index, step, dim=1)]
+        return torch.cat(preds).numpy() if preds else np.zeros(0)
+    if isinstance(predictor, torch.nn.Module):
+        predictor.eval()
+    return score_fn
+
+
+def stream_score(path: str, out_path: str, score_fn: Callable[[torch.Tensor], np.ndarray],
+                 chunk_size: int = 1000000, sep: str = None, skiprows: int = 0) -> np.ndarray:
+    """
+    Score every pair of an edge file and write the scores to out_path.
+    :param path: edge file, see the module docstring for the formats
+    :param out_path: .npy file of float32 scores, shaped like the edge file without its pair dimension
+    :param score_fn: score_fn(edge_index [2, B]) -> B scores, see heuristic_scorer and predictor_scorer
+    :param chunk_size: number of pairs read and scored at once, bounds the peak memory
+    :return: the scores, memory-mapped read only
+    """
+    shape = edge_file_shape(path, skiprows)
+    num_edges = int(np.prod(shape))
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    # write to a temporary file first so that readers never see half the scores
+    tmp = os.path.join(os.path.dirname(os.path.abspath(out_path)), f'.{os.path.basename(out_path)}.{os.getpid()}.npy')
+    out = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float32, shape=(num_edges,))
+    written = 0
+    try:
+        with tqdm(total=num_edges) as pbar:
+            for edge_index in iter_edge_chunks(path, chunk_size, sep, skiprows):
+                num = edge_index.size(1)
+                if written + num > num_edges:
+                    raise ValueError(f'{path} holds more pairs than the {num_edges} expected')
+                scores = np.asarray(score_fn(edge_index), dtype=np.float32).reshape(-1)
+                if scores.shape[0] != num:
+                    raise ValueError(f'score_fn returned {scores.shape[0]} scores for {num} edges')
+                out[written:written + num] = scores
+                written += num
+                pbar.update(num)
+        if written != num_edges:
+            raise ValueError(f'read {written} pairs from {path} but expected {num_edges}, blank or malformed lines?')
+        out.flush()
+    except BaseException:
+        del out
+        os.remove(tmp)
+        raise
+    del out
+    os.replace(tmp, out_path)
+    print(f'scored {num_edges} edges from {path}, saved to {out_path}')
+    return np.load(out_path, mmap_mode='r').reshape(shape)
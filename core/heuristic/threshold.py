@@ -0,0 +1,105 @@
+"""
+Threshold dependent metrics of link predictors, computed on the device of the scores.
+threshold_sweep evaluates accuracy, precision, recall and F1 at every distinct score from one sort, so the best
+threshold comes for free instead of one pass per candidate; calibration_curve and expected_calibration_error
+report how well sigmoid scores match the observed link rate.
+"""
+from typing import Dict, Sequence
+import torch
+
+
+def _labels(pos_pred, neg_pred):
+    pos_pred, neg_pred = torch.as_tensor(pos_pred).reshape(-1), torch.as_tensor(neg_pred).reshape(-1)
+    neg_pred = neg_pred.to(pos_pred.device)
+    dtype = torch.promote_types(pos_pred.dtype, neg_pred.dtype)
+    y_pred = torch.cat([pos_pred, neg_pred]).to(dtype)
+    y_true = torch.cat([torch.ones(pos_pred.size(0), dtype=torch.float64, device=y_pred.device),
+                        torch.zeros(neg_pred.size(0), dtype=torch.float64, device=y_pred.device)])
+    return y_pred, y_true
+
+
+def threshold_sweep(pos_pred, neg_pred, thresholds: Sequence[float] = None) -> Dict[str, torch.Tensor]:
+    '''
+        Accuracy, precision, recall and F1 of predicting score >= threshold as a link.
+        :param pos_pred: scores of the positives (torch.Tensor of shape [P])
+        :param neg_pred: scores of the negatives (torch.Tensor of shape [N])
+        :param thresholds: candidate thresholds, every distinct score (and +inf, predicting no link) if None
+        :return: curves 'threshold', 'ACC', 'precision', 'recall', 'F1' of the same length,
+                 and 'best_acc_threshold', 'best_f1_threshold' (first best in the order of the thresholds)
+    '''
+    y_pred, y_true = _labels(pos_pred, neg_pred)
+    num_pos = y_true.sum()
+    num_neg = y_true.numel() - num_pos
+
+    if thresholds is None:
+        y_pred, order = torch.sort(y_pred, descending=True, stable=True)
+        y_true = y_true[order]
+        # predicting score >= s_i as a link covers everything up to the last position of the run of s_i
+        last = torch.ones_like(y_true, dtype=torch.bool)
+        last[:-1] = y_pred[1:] != y_pred[:-1]
+        tp = torch.cumsum(y_true, 0)[last]
+        predicted = (torch.nonzero(last).view(-1) + 1).to(tp.dtype)
+        threshold = torch.cat([y_pred.new_full((1,), float('inf')), y_pred[last]])
+        tp, predicted = torch.cat([tp.new_zeros(1), tp]), torch.cat([predicted.new_zeros(1), predicted])
+    else:
+        threshold = torch.as_tensor(thresholds, dtype=y_pred.dtype, device=y_pred.device).reshape(-1)
+        pos_sorted, neg_sorted = torch.sort(y_pred[y_true == 1])[0], torch.sort(y_pred[y_true == 0])[0]
+        tp = (pos_sorted.numel() - torch.searchsorted(pos_sorted, threshold, right=False)).double()
+        fp = (neg_sorted.numel() - torch.searchsorted(neg_sorted, threshold, right=False)).double()
+        predicted = tp + fp
+
+    fp = predicted - tp
+    curves = {
+        'threshold': threshold,
+        'ACC': (tp + num_neg - fp) / (num_pos + num_neg),
+        'precision': torch.where(predicted > 0, tp / predicted.clamp(min=1), torch.ones_like(tp)),
+        'recall': tp / num_pos.clamp(min=1),
+        # 2 TP / (2 TP + FP + FN)
+        'F1': 2 * tp / (predicted + num_pos).clamp(min=1),
+    }
+    curves['best_acc_threshold'] = threshold[torch.argmax(curves['ACC'])]
+    curves['best_f1_threshold'] = threshold[torch.argmax(curves['F1'])]
+    return curves
+
+
+def calibration_curve(pred, target, num_bins: int = 15) -> Dict[str, torch.Tensor]:
+    '''
+        Reliability diagram with num_bins equal-width bins over [0, 1].
+        :param pred: probabilities, e.g. sigmoid scores of the decoder
+        :param target: 0 / 1 labels
+        :return: 'count', 'confidence' (mean probability) and 'frequency' (mean label) of every bin
+    '''
+    pred = torch.as_tensor(pred).reshape(-1).double()
+    target = torch.as_tensor(target).reshape(-1).to(pred)
+    bins = (pred * num_bins).long().clamp(0, num_bins - 1)
+    count = torch.bincount(bins, minlength=num_bins).double()
+    confidence = torch.bincount(bins, weights=pred, minlength=num_bins) / count.clamp(min=1)
+    frequency = torch.bincount(bins, weights=target, minlength=num_bins) / count.clamp(min=1)
+    return {'count': count, 'confidence': confidence, 'frequency': frequency}
+
+
+def expected_calibration_error(pred, target, num_bins: int = 15) -> torch.Tensor:
+    '''
+        ECE, the mean |frequency - confidence| of the calibration_curve bins weighted by their size
+    '''
+    curve = calibration_curve(pred, target, num_bins)
+    return (curve['count'] * (curve['frequency'] - curve['confidence']).abs()).sum() / curve['count'].sum().clamp(min=1)
+
+
+def threshold_metrics(pos_pred, neg_pred, num_bins: int = 15) -> Dict[str, float]:
+    '''
+        Report of the best accuracy and F1 over all thresholds and the ECE of sigmoid scores,
+        transferred to the host once.
+    '''
+    curves = threshold_sweep(pos_pred, neg_pred)
+    best_acc, best_f1 = torch.argmax(curves['ACC']), torch.argmax(curves['F1'])
+    y_pred, y_true = _labels(pos_pred, neg_pred)
+    metrics = {
+        'best_ACC': curves['ACC'][best_acc],
+        'best_ACC_threshold': curves['threshold'][best_acc].double(),
+        'best_F1': curves['F1'][best_f1],
+        'best_F1_threshold': curves['threshold'][best_f1].double(),
+        'ECE': expected_calibration_error(y_pred, y_true, num_bins),
+    }
+    values = torch.stack(list(metrics.values())).tolist()
+    return {key: round(value, 4) for key, value in zip(metrics, values)}
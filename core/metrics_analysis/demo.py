@@ -4,10 +4,13 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from ogb.linkproppred import Evaluator
 import torch
+import numpy as np
 
 from sklearn.metrics import roc_auc_score
 from sklearn.metrics import average_precision_score
 import matplotlib.pyplot as plt
+from heuristic.eval import evaluate_mrr_shared
+from heuristic.rank_artifact import load_rank_artifact
 
 # def evaluate_hits(test_pred, labels)
 def evaluate_hits(evaluator, pos_pred, neg_pred, k_list):
@@ -128,20 +131,22 @@ def eval_mrr(y_pred_pos, y_pred_neg):
 
 
 
-def eval_hard_negs(pos_pred, neg_pred, k_list):
+def eval_hard_negs(pos_pred, neg_pred, k_list, ranking_list=None):
     """
-    Eval on hard negatives
+    Eval on hard negatives, ranking_list skips the ranking when the ranks are known, e.g. of a rank artifact
     """
-    neg_pred = neg_pred.squeeze(-1)
+    if ranking_list is None:
+        neg_pred = neg_pred.squeeze(-1)
 
-    # optimistic rank: "how many negatives have at least the positive score?"
-    # ~> the positive is ranked first among those with equal score
-    optimistic_rank = (neg_pred >= pos_pred).sum(dim=-1)
+        # optimistic rank: "how many negatives have at least the positive score?"
+        # ~> the positive is ranked first among those with equal score
+        optimistic_rank = (neg_pred >= pos_pred).sum(dim=-1)
 
-    # pessimistic rank: "how many negatives have a larger score than the positive?"
-    # ~> the positive is ranked last among those with equal score
-    pessimistic_rank = (neg_pred > pos_pred).sum(dim=-1)
-    ranking_list = 0.5 * (optimistic_rank + pessimistic_rank) + 1
+        # pessimistic rank: "how many negatives have a larger score than the positive?"
+        # ~> the positive is ranked last among those with equal score
+        pessimistic_rank = (neg_pred > pos_pred).sum(dim=-1)
+        ranking_list = 0.5 * (optimistic_rank + pessimistic_rank) + 1
+    ranking_list = torch.as_tensor(ranking_list)
 
     results = {}
     for k in k_list:
@@ -154,6 +159,15 @@ def eval_hard_negs(pos_pred, neg_pred, k_list):
     return results
 
 
+def eval_rank_artifact(artifact_dir, k_list):
+    """
+    Eval a saved evaluation (heuristic/rank_artifact.py), only the memory-mapped rank column of the positives is read
+    """
+    artifact = load_rank_artifact(artifact_dir)
+    ranking_list = torch.from_numpy(np.asarray(artifact['pos']['rank'], dtype=np.float32))
+    return eval_hard_negs(None, None, k_list, ranking_list=ranking_list)
+
+
 
 def get_prediction(full_A, use_heuristic, pos_test_edge, neg_test_edge):
 
@@ -172,7 +186,7 @@ def get_metric_score(evaluator_hit, evaluator_mrr, pos_test_pred, neg_test_pred)
         f'Hits@{K}': result_hit_test[f'Hits@{K}']
         for K in [1, 3, 10, 20, 50, 100]
     }
-    result_mrr_test = evaluate_mrr(evaluator_mrr, pos_test_pred, neg_test_pred.repeat(pos_test_pred.size(0), 1))
+    result_mrr_test = evaluate_mrr_shared(pos_test_pred, neg_test_pred)
 
     result['MRR'] = (result_mrr_test['MRR'])
     result['mrr_hit1']  = (result_mrr_test['mrr_hit1'])